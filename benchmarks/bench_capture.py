@@ -0,0 +1,71 @@
+"""Capturing large outputs into memory, ring buffer and temporary file"""
+
+from functools import partial
+import shutil
+
+from benchmarks.bench_pipe import repeat_for, run, run_async
+from benchmarks.harness import (
+    Case,
+    anyio_timeit,
+    asyncio_timeit,
+    format_size,
+    sync_timeit,
+)
+from recmd.command import Command
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.stream import Capture, SpillCapture, TailCapture
+
+CAPTURE_LIMIT = 256 << 20
+"""`Capture` keeps whole output in memory, larger sizes are skipped"""
+
+CAPTURES = {
+    "capture": Capture,
+    "tail": partial(TailCapture, 1 << 20),
+    "spill": partial(SpillCapture, 16 << 20),
+}
+
+
+def capture(size: int, stream):
+    return Command(["head", "-c", str(size), "/dev/zero"]) >> stream()
+
+
+def cases(options):
+    if shutil.which("head") is None:
+        return
+    for size in options.sizes:
+        label = format_size(size)
+        for kind, stream in CAPTURES.items():
+            if kind == "capture" and size > CAPTURE_LIMIT:
+                continue
+            yield Case(
+                f"capture.{kind}.popen[{label}]",
+                partial(
+                    sync_timeit,
+                    SubprocessExecutor(),
+                    partial(run, capture, size, stream),
+                ),
+                repeat=repeat_for(size),
+                size=size,
+            )
+            for backend in options.backends:
+                yield Case(
+                    f"capture.{kind}.anyio-{backend}[{label}]",
+                    partial(
+                        anyio_timeit,
+                        backend,
+                        partial(run_async, capture, size, stream),
+                    ),
+                    repeat=repeat_for(size),
+                    size=size,
+                )
+            for loop in options.loops:
+                yield Case(
+                    f"capture.{kind}.asyncio-{loop}[{label}]",
+                    partial(
+                        asyncio_timeit,
+                        loop,
+                        partial(run_async, capture, size, stream),
+                    ),
+                    repeat=repeat_for(size),
+                    size=size,
+                )
@@ -0,0 +1,61 @@
+"""Import time of modules with `@sh` functions depending on module size, compared to same module without `@sh`"""
+
+from functools import partial
+import importlib
+import linecache
+import sys
+import tempfile
+
+from benchmarks.harness import Case, timeit
+from recmd.patcher import ModuleIndex
+
+FUNCTION = """
+{decorator}
+def command_{index}(path, pattern, flags=()):
+    return sh(f"grep -rn --color=never {{flags}} -e {{pattern}} {{path}}")
+"""
+
+
+def generate(directory: str, name: str, functions: int, decorated: bool):
+    decorator = "@sh" if decorated else ""
+    with open(f"{directory}/{name}.py", "w") as file:
+        file.write("from recmd import sh\n")
+        for index in range(functions):
+            file.write(FUNCTION.format(decorator=decorator, index=index))
+
+
+def fresh_import(name: str):
+    """Import module as in new process (bytecode of module is cached after warmup)"""
+    sys.modules.pop(name, None)
+    ModuleIndex.cache.pop(name, None)
+    linecache.clearcache()
+    importlib.import_module(name)
+
+
+def run(functions: int, decorated: bool, repeat: int, warmup: int):
+    name = f"recmd_bench_{'sh' if decorated else 'plain'}_{functions}"
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, name, functions, decorated)
+        sys.path.insert(0, directory)
+        importlib.invalidate_caches()
+        try:
+            return timeit(partial(fresh_import, name), repeat, warmup)
+        finally:
+            sys.path.remove(directory)
+            sys.modules.pop(name, None)
+            ModuleIndex.cache.pop(name, None)
+
+
+def cases(options):
+    for functions in options.functions:
+        repeat = max(3, min(50, 5000 // functions))
+        yield Case(
+            f"patch.import.sh[functions={functions}]",
+            partial(run, functions, True),
+            repeat=repeat,
+        )
+        yield Case(
+            f"patch.import.plain[functions={functions}]",
+            partial(run, functions, False),
+            repeat=repeat,
+        )
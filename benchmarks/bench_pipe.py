@@ -0,0 +1,67 @@
+"""Throughput of pipelines between processes and of stdin written by current process"""
+
+from functools import cache, partial
+import shutil
+
+from benchmarks.harness import Case, anyio_timeit, format_size, sync_timeit
+from recmd.command import Command
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.stream import DevNull, Send
+
+SEND_LIMIT = 256 << 20
+"""`Send` keeps whole input in memory, larger sizes are skipped"""
+
+
+def pipeline(size: int):
+    source = Command(["head", "-c", str(size), "/dev/zero"])
+    return source | Command(["cat"]) >> DevNull()
+
+
+@cache
+def zeros(size: int) -> bytes:
+    """Input of `send`, allocated on first (warmup) run"""
+    return bytes(size)
+
+
+def send(size: int):
+    return Command(["cat"]).with_stdin(Send(zeros(size))) >> DevNull()
+
+
+def run(factory, *args):
+    factory(*args).run()
+
+
+async def run_async(factory, *args):
+    await factory(*args).run_async()
+
+
+def repeat_for(size: int) -> int:
+    if size >= 1 << 30:
+        return 3
+    if size >= 64 << 20:
+        return 5
+    return 20
+
+
+def cases(options):
+    if shutil.which("head") is None or shutil.which("cat") is None:
+        return
+    for size in options.sizes:
+        label = format_size(size)
+        variants = [("pipeline", pipeline)]
+        if size <= SEND_LIMIT:
+            variants.append(("send", send))
+        for kind, factory in variants:
+            yield Case(
+                f"pipe.{kind}.popen[{label}]",
+                partial(sync_timeit, SubprocessExecutor(), partial(run, factory, size)),
+                repeat=repeat_for(size),
+                size=size,
+            )
+            for backend in options.backends:
+                yield Case(
+                    f"pipe.{kind}.anyio-{backend}[{label}]",
+                    partial(anyio_timeit, backend, partial(run_async, factory, size)),
+                    repeat=repeat_for(size),
+                    size=size,
+                )
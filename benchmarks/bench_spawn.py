@@ -0,0 +1,61 @@
+"""Latency of single command (spawn, wait and stream cleanup) for every executor"""
+
+from functools import partial
+import shutil
+
+from benchmarks.harness import Case, anyio_timeit, asyncio_timeit, sync_timeit
+from benchmarks.spawn_rss import allocate
+from recmd.command import Command
+from recmd.executor.spawn import SpawnExecutor
+from recmd.executor.subprocess import SubprocessExecutor
+
+
+def run_sync(executor, executable: str, rss: int, repeat: int, warmup: int):
+    # parent RSS affects fork-based spawn (see spawn_rss.py)
+    ballast = allocate(rss) if rss else None
+    try:
+        return sync_timeit(
+            executor, lambda: Command([executable]).run(), repeat, warmup
+        )
+    finally:
+        del ballast
+
+
+def run_async(timeit, loop: str, executable: str, rss: int, repeat: int, warmup: int):
+    ballast = allocate(rss) if rss else None
+    try:
+        return timeit(loop, lambda: Command([executable]).run_async(), repeat, warmup)
+    finally:
+        del ballast
+
+
+def cases(options):
+    executable = shutil.which("true")
+    if executable is None:
+        return
+    for rss in options.rss:
+        suffix = f"[rss={rss}MB]" if rss else ""
+        for name, executor in (
+            ("popen", SubprocessExecutor()),
+            ("posix_spawn", SpawnExecutor()),
+        ):
+            yield Case(
+                f"spawn.{name}{suffix}",
+                partial(run_sync, executor, executable, rss),
+                repeat=100,
+                warmup=10,
+            )
+        for backend in options.backends:
+            yield Case(
+                f"spawn.anyio-{backend}{suffix}",
+                partial(run_async, anyio_timeit, backend, executable, rss),
+                repeat=100,
+                warmup=10,
+            )
+        for loop in options.loops:
+            yield Case(
+                f"spawn.asyncio-{loop}{suffix}",
+                partial(run_async, asyncio_timeit, loop, executable, rss),
+                repeat=100,
+                warmup=10,
+            )
@@ -0,0 +1,45 @@
+"""Command construction: f-string in `@sh` function, t-string (python 3.14+) and argument list"""
+
+from functools import partial
+
+from benchmarks.harness import Case, timeit
+from recmd.command import Command
+from recmd.shell import sh
+
+NUMBER = 1000
+"""Calls per repetition, construction takes microseconds"""
+
+
+@sh
+def fstring_command(path: str, pattern: str):
+    return sh(f"grep -rn --color=never -e {pattern} {path}")
+
+
+def list_command(path: str, pattern: str):
+    return Command(["grep", "-rn", "--color=never", "-e", pattern, path])
+
+
+try:
+    # t-strings are syntax error before python 3.14, so module is still importable
+    tstring_command = eval(
+        'lambda path, pattern: sh(t"grep -rn --color=never -e {pattern} {path}")'
+    )
+except SyntaxError:
+    tstring_command = None
+
+
+def run(factory, repeat: int, warmup: int):
+    return timeit(
+        partial(factory, "src/some dir", "pattern with spaces"),
+        repeat,
+        warmup,
+        number=NUMBER,
+    )
+
+
+def cases(options):
+    commands = {"fstring": fstring_command, "list": list_command}
+    if tstring_command is not None:
+        commands["tstring"] = tstring_command
+    for name, factory in commands.items():
+        yield Case(f"construct.{name}", partial(run, factory), repeat=50)
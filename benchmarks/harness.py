@@ -0,0 +1,236 @@
+"""Timing, statistics, JSON results and baseline comparison shared by benchmarks"""
+
+import datetime
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable
+
+SIZES = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+
+
+def parse_size(value: str) -> int:
+    """Parse size like `100MB` (binary units)"""
+    value = value.strip().upper()
+    for suffix, multiplier in SIZES.items():
+        if value.endswith(suffix):
+            return int(float(value[: -len(suffix)]) * multiplier)
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    for suffix, multiplier in reversed(SIZES.items()):
+        if size >= multiplier and size % multiplier == 0:
+            return f"{size // multiplier}{suffix}"
+    return str(size)
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f}{unit}"
+    return f"{seconds / 1e-9:.1f}ns"
+
+
+class Case:
+    """
+    Single benchmark, `run(repeat, warmup)` returns timings of every repetition in seconds
+
+    `size` is amount of bytes processed by one repetition (throughput is reported for it)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[int, int], list[float]],
+        repeat: int = 20,
+        warmup: int = 2,
+        size: int | None = None,
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.repeat = repeat
+        self.warmup = warmup
+        self.size = size
+
+
+def timeit(
+    fn: Callable[[], Any], repeat: int, warmup: int, number: int = 1
+) -> list[float]:
+    """Timings of `repeat` repetitions, repetition calls fn `number` times and reports time of single call"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    # collections of previous repetitions should not be counted
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+async def timeit_async(
+    fn: Callable[[], Awaitable[Any]], repeat: int, warmup: int
+) -> list[float]:
+    for _ in range(warmup):
+        await fn()
+    timings = []
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(case: Case, timings: list[float]) -> dict[str, Any]:
+    ordered = sorted(timings)
+    result: dict[str, Any] = {
+        "repeat": len(timings),
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+    if case.size is not None:
+        result["size"] = case.size
+        result["throughput"] = case.size / result["median"]
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata() -> dict[str, Any]:
+    """Environment of run, comparison warns when it differs from baseline"""
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "commit": _git_commit(),
+        "date": datetime.datetime.now(datetime.UTC).isoformat(timespec="seconds"),
+    }
+
+
+COMPARED_METADATA = ("python", "implementation", "platform", "machine", "cpu_count")
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> tuple[list[str], list[str]]:
+    """
+    Compare medians with baseline, returns (report lines, names of regressed benchmarks)
+
+    Benchmark is regressed when its median is slower than baseline by more than `threshold` (0.1 = 10%)
+    """
+    lines = []
+    for key in COMPARED_METADATA:
+        if results["metadata"].get(key) != baseline["metadata"].get(key):
+            lines.append(
+                f"warning: {key} differs from baseline: "
+                f"{baseline['metadata'].get(key)} -> {results['metadata'].get(key)}"
+            )
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            lines.append(f"{name:<60} new")
+            continue
+        ratio = current["median"] / base["median"]
+        if ratio > 1 + threshold:
+            status = "slower"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = "faster"
+        else:
+            status = ""
+        lines.append(
+            f"{name:<60} {format_time(base['median']):>10} -> "
+            f"{format_time(current['median']):>10} {ratio:>6.2f}x {status}"
+        )
+    return lines, regressions
+
+
+def sync_timeit(
+    executor: Any, fn: Callable[[], Any], repeat: int, warmup: int
+) -> list[float]:
+    """`timeit` with executor set for commands"""
+    with executor.use():
+        return timeit(fn, repeat, warmup)
+
+
+def anyio_timeit(
+    backend: str, fn: Callable[[], Awaitable[Any]], repeat: int, warmup: int
+) -> list[float]:
+    """`timeit_async` in new event loop of backend with `AnyioExecutor`"""
+    import anyio
+    from recmd.executor.anyio import AnyioExecutor
+
+    async def main():
+        with AnyioExecutor().use():
+            return await timeit_async(fn, repeat, warmup)
+
+    return anyio.run(main, backend=backend)
+
+
+def asyncio_timeit(
+    loop: str, fn: Callable[[], Awaitable[Any]], repeat: int, warmup: int
+) -> list[float]:
+    """`timeit_async` in new asyncio (or uvloop) event loop with `AsyncioExecutor`"""
+    import asyncio
+    from recmd.executor.asyncio import AsyncioExecutor
+
+    async def main():
+        with AsyncioExecutor().use():
+            return await timeit_async(fn, repeat, warmup)
+
+    if loop == "uvloop":
+        import uvloop
+
+        return uvloop.run(main())
+    return asyncio.run(main())
+
+
+def asyncio_loops() -> list[str]:
+    """Event loops for `AsyncioExecutor`"""
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return ["asyncio"]
+    return ["asyncio", "uvloop"]
+
+
+def anyio_backends() -> list[str]:
+    """Installed anyio backends"""
+    try:
+        import anyio  # noqa: F401
+    except ImportError:
+        return []
+    backends = ["asyncio"]
+    try:
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        backends.append("trio")
+    return backends
@@ -0,0 +1,118 @@
+"""
+Run benchmarks, write results as JSON and compare them with baseline
+
+python -m benchmarks.run --output results.json
+python -m benchmarks.run --baseline results.json -k spawn -k pipe
+python -m benchmarks.run --quick --list
+
+Exit code is 1 when some benchmark is slower than baseline by more than threshold
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks import (
+    bench_capture,
+    bench_patch,
+    bench_pipe,
+    bench_spawn,
+    bench_template,
+)
+from benchmarks.harness import (
+    anyio_backends,
+    asyncio_loops,
+    compare,
+    format_size,
+    format_time,
+    metadata,
+    parse_size,
+    summarize,
+)
+
+MODULES = [bench_spawn, bench_pipe, bench_capture, bench_patch, bench_template]
+
+
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("-k", dest="filters", action="append", default=[])
+    parser.add_argument("--output", help="write results to JSON file")
+    parser.add_argument("--baseline", help="compare with results of previous run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--sizes", nargs="+", default=["1MB", "100MB", "1GB"])
+    parser.add_argument("--functions", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rss", type=int, nargs="+", default=[0], help="MB")
+    parser.add_argument("--backends", nargs="+", default=anyio_backends())
+    parser.add_argument("--loops", nargs="+", default=asyncio_loops())
+    parser.add_argument("--repeat", type=int, help="override repetitions of cases")
+    parser.add_argument(
+        "--quick", action="store_true", help="small sizes and few repetitions"
+    )
+    parser.add_argument("--list", action="store_true", help="list cases and exit")
+    options = parser.parse_args(argv)
+    if options.quick:
+        options.sizes = ["1MB", "16MB"]
+        options.functions = [10, 100]
+    options.sizes = [parse_size(x) for x in options.sizes]
+    return options
+
+
+def main(argv: list[str] | None = None) -> int:
+    options = parse_args(argv)
+    cases = [
+        case
+        for module in MODULES
+        for case in module.cases(options)
+        if not options.filters or any(x in case.name for x in options.filters)
+    ]
+    if options.list:
+        for case in cases:
+            print(case.name)
+        return 0
+
+    results = {
+        "metadata": metadata(),
+        "options": {
+            "sizes": [format_size(x) for x in options.sizes],
+            "functions": options.functions,
+            "rss": options.rss,
+            "backends": options.backends,
+            "loops": options.loops,
+            "quick": options.quick,
+        },
+        "benchmarks": {},
+    }
+    for case in cases:
+        repeat = options.repeat or case.repeat
+        warmup = case.warmup
+        if options.quick:
+            repeat, warmup = max(3, repeat // 10), min(warmup, 1)
+        summary = summarize(case, case.run(repeat, warmup))
+        results["benchmarks"][case.name] = summary
+        line = f"{case.name:<60} {format_time(summary['median']):>10} p99 {format_time(summary['p99']):>10}"
+        if "throughput" in summary:
+            line += f" {summary['throughput'] / (1 << 20):>10.1f}MB/s"
+        print(line, flush=True)
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        lines, regressions = compare(results, baseline, options.threshold)
+        print()
+        print("\n".join(lines))
+        if regressions:
+            print(
+                f"\n{len(regressions)} regressions (threshold {options.threshold:.0%})"
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Spawn latency of SubprocessExecutor (Popen) and SpawnExecutor (posix_spawn) depending on parent RSS
+
+python benchmarks/spawn_rss.py --rss 100 2048 --count 200
+"""
+
+import argparse
+import shutil
+import statistics
+import time
+
+from recmd.command import Command
+from recmd.executor.abc import SyncExecutor
+from recmd.executor.spawn import SpawnExecutor
+from recmd.executor.subprocess import SubprocessExecutor
+
+PAGE = 4096
+
+
+def allocate(megabytes: int) -> bytearray:
+    """Allocate memory and touch every page, so it is counted in RSS"""
+    ballast = bytearray(megabytes << 20)
+    ballast[::PAGE] = b"\x01" * len(range(0, len(ballast), PAGE))
+    return ballast
+
+
+def measure(executor: SyncExecutor, executable: str, count: int) -> list[float]:
+    timings = []
+    with executor.use():
+        for _ in range(count):
+            start = time.perf_counter()
+            Command([executable]).run()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rss", type=int, nargs="+", default=[100, 2048], help="MB")
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    executable = shutil.which("true")
+    assert executable is not None, "true is not found"
+    executors = {"popen": SubprocessExecutor(), "posix_spawn": SpawnExecutor()}
+    print(f"{'rss':>8} {'executor':>12} {'mean ms':>9} {'median ms':>10} {'p99 ms':>8}")
+    for megabytes in args.rss:
+        ballast = allocate(megabytes)
+        for name, executor in executors.items():
+            measure(executor, executable, 10)  # warm up
+            timings = sorted(measure(executor, executable, args.count))
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            print(
+                f"{megabytes:>6}MB {name:>12} {statistics.mean(timings) * 1e3:>9.3f} "
+                f"{statistics.median(timings) * 1e3:>10.3f} {p99 * 1e3:>8.3f}"
+            )
+        del ballast
+
+
+if __name__ == "__main__":
+    main()
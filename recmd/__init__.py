@@ -1,19 +1,43 @@
 from contextlib import suppress
-from .exceptions import TransformError
+from .exceptions import CommandTimeout, SessionError, TransformError
+from .code_cache import CodeCache
 from .patcher import (
     patch_function,
     apply_patch,
     AnyFunctionDef,
     line_attributes,
     get_ast,
+    queue_patch,
+    lazy_patch,
+    ModuleIndex,
 )
 from .shell_patch import patch_shell_arguments
 from .executor.abc import SyncExecutor, AsyncExecutor
-from .shell import sh, shell
-from .stream import Capture, DevNull, FileStream, IOStream, Send, Stream, Pipe
+from .executor.hooks import HookEvent, Hooks
+from .shell import sh, shell, set_lazy
+from .stream import (
+    Capture,
+    DevNull,
+    Feed,
+    FileStream,
+    IOStream,
+    Send,
+    SendFile,
+    Stream,
+    Pipe,
+    SpillCapture,
+    TailCapture,
+    Tee,
+)
 from .executor.subprocess import SubprocessExecutor
+from .executor.spawn import SpawnExecutor
+from .bulk import run_many, run_many_async
+from .session import Delimited, Framing, LengthPrefixed, Sentinel, Session, SessionPool
+
+from .executor.asyncio import AsyncioExecutor
 
 SyncExecutor.set_default(SubprocessExecutor())
+AsyncExecutor.set_default(AsyncioExecutor())
 
 with suppress(ImportError):
     from .executor.anyio import AnyioExecutor
@@ -22,23 +46,47 @@ with suppress(ImportError):
 
 __all__ = [
     "TransformError",
+    "CommandTimeout",
+    "SessionError",
+    "CodeCache",
     "patch_function",
     "apply_patch",
     "AnyFunctionDef",
     "line_attributes",
     "get_ast",
+    "queue_patch",
+    "lazy_patch",
+    "ModuleIndex",
     "patch_shell_arguments",
     "SyncExecutor",
     "AsyncExecutor",
+    "HookEvent",
+    "Hooks",
     "AnyioExecutor",
+    "AsyncioExecutor",
     "SubprocessExecutor",
+    "SpawnExecutor",
+    "run_many",
+    "run_many_async",
+    "Session",
+    "SessionPool",
+    "Framing",
+    "Delimited",
+    "LengthPrefixed",
+    "Sentinel",
     "sh",
     "shell",
+    "set_lazy",
     "Capture",
     "DevNull",
+    "Feed",
     "FileStream",
     "IOStream",
     "Send",
+    "SendFile",
     "Stream",
     "Pipe",
+    "SpillCapture",
+    "TailCapture",
+    "Tee",
 ]
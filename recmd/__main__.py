@@ -0,0 +1,44 @@
+import argparse
+from pathlib import Path
+import sys
+
+from .compiler import compile_tree
+from .exceptions import TransformError
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m recmd")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser(
+        "compile",
+        help='rewrite sh(f"...") calls inside @sh functions into argument lists',
+    )
+    compile_parser.add_argument(
+        "paths", nargs="+", type=Path, help="files or directories"
+    )
+    compile_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="write compiled python files into this directory instead of changing them inplace",
+    )
+    compile_parser.add_argument(
+        "--check",
+        action="store_true",
+        help="don't write files, exit with status 1 if any file would be changed",
+    )
+
+    args = parser.parse_args(argv)
+    try:
+        changed = compile_tree(args.paths, args.output, write=not args.check)
+    except (SyntaxError, TransformError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    for path in changed:
+        print(f"{'would compile' if args.check else 'compiled'} {path}")
+    return 1 if args.check and changed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
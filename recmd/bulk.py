@@ -0,0 +1,141 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager, suppress
+from contextvars import copy_context
+import os
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+from .map_result import Runnable
+
+if TYPE_CHECKING:
+    import anyio
+    from anyio.streams.memory import MemoryObjectSendStream
+
+__all__ = ["run_many", "run_many_async"]
+
+DEFAULT_LIMIT = os.cpu_count() or 1
+
+
+def run_many[C: Runnable](
+    commands: Iterable[C], limit: int = DEFAULT_LIMIT, ordered: bool = False
+) -> Iterator[C]:
+    """
+    Run commands (or command groups) using up to `limit` threads, yields commands as they complete
+
+    Next command is taken from iterable only when there is free slot, with `ordered` commands are yielded in input order
+    (completed commands wait for slower previous ones and occupy their slots).
+    If iteration stops early, not started commands are skipped and running ones are waited
+    """
+    assert limit > 0, "limit should be positive"
+    iterator = iter(commands)
+    pending: deque[Future[C]] = deque()
+    pool = ThreadPoolExecutor(limit, thread_name_prefix="recmd-run-many")
+
+    def submit():
+        for command in iterator:
+            # executor is selected using context variables, so context is passed to worker
+            pending.append(pool.submit(copy_context().run, command.run))
+            return True
+        return False
+
+    try:
+        while len(pending) < limit and submit():
+            pass
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = next(x for x in pending if x in done)
+                pending.remove(future)
+            command = future.result()
+            submit()
+            yield command
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Result[C]:
+    def __init__(self, command: C, event: "anyio.Event") -> None:
+        self.command = command
+        self.event = event
+        self.error: BaseException | None = None
+
+
+async def _iterate[T](items: Iterable[T] | AsyncIterable[T]) -> AsyncIterator[T]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+@asynccontextmanager
+async def run_many_async[C: Runnable](
+    commands: Iterable[C] | AsyncIterable[C],
+    limit: int = DEFAULT_LIMIT,
+    ordered: bool = False,
+) -> AsyncIterator[AsyncIterator[C]]:
+    """
+    Run commands (or command groups) concurrently, at most `limit` commands are running or waiting to be consumed
+
+    ```
+    async with run_many_async(commands, limit=8) as results:
+        async for command in results:
+            ...
+    ```
+
+    If block exits early, not started commands are skipped and running ones are waited
+    """
+    import anyio
+
+    assert limit > 0, "limit should be positive"
+    limiter = anyio.CapacityLimiter(limit)
+    # results are sent in input order (ordered) or in completion order by workers
+    send, receive = anyio.create_memory_object_stream[_Result[C]](limit)
+
+    async def run(result: _Result[C], target: "MemoryObjectSendStream | None"):
+        try:
+            await result.command.run_async()
+        except Exception as e:
+            result.error = e
+        result.event.set()
+        if target is not None:
+            async with target:
+                with suppress(anyio.BrokenResourceError):
+                    await target.send(result)
+
+    async def produce(task_group: "anyio.abc.TaskGroup"):
+        async with send:
+            async for command in _iterate(commands):
+                result = _Result(command, anyio.Event())
+                # slot is released when result is consumed
+                await limiter.acquire_on_behalf_of(result)
+                if ordered:
+                    task_group.start_soon(run, result, None)
+                    await send.send(result)
+                else:
+                    task_group.start_soon(run, result, send.clone())
+
+    async def results() -> AsyncIterator[C]:
+        async for result in receive:
+            await result.event.wait()
+            limiter.release_on_behalf_of(result)
+            if result.error is not None:
+                raise result.error
+            yield result.command
+
+    async with anyio.create_task_group() as task_group:
+        producer = anyio.CancelScope()
+
+        async def start():
+            with producer:
+                await produce(task_group)
+
+        task_group.start_soon(start)
+        try:
+            yield results()
+        finally:
+            producer.cancel()
+            receive.close()
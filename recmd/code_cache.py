@@ -0,0 +1,133 @@
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+import hashlib
+from importlib.util import MAGIC_NUMBER
+import marshal
+import os
+from pathlib import Path, PurePath
+import re
+import sys
+import types
+from typing import Any, Callable, ClassVar, Sequence
+
+__all__ = ["CodeCache", "patcher_key"]
+
+UNSAFE_CHARACTERS = re.compile(r"[^\w.-]")
+
+
+def patcher_key(patcher: Callable) -> str | None:
+    """
+    Identity of patcher used in cache key, None if patcher can't be identified (lambdas, local functions)
+
+    Can be overridden by setting `__recmd_cache_key__` attribute on patcher
+    """
+    key = getattr(patcher, "__recmd_cache_key__", None)
+    if key is not None:
+        return key
+    module = getattr(patcher, "__module__", None)
+    qualname = getattr(patcher, "__qualname__", None)
+    if module is None or qualname is None or "<" in qualname:
+        return None
+    # invalidate cache when module of patcher is changed
+    stamp = ""
+    if file := getattr(sys.modules.get(module), "__file__", None):
+        with suppress(OSError):
+            stat = os.stat(file)
+            stamp = f"@{stat.st_mtime_ns}:{stat.st_size}"
+    return f"{module}.{qualname}{stamp}"
+
+
+class CodeCache:
+    """
+    Persistent cache of patched code objects (similar to __pycache__)
+
+    Entries are keyed by source hash, function qualname, first line, patchers and python version
+    """
+
+    context: ClassVar = ContextVar["CodeCache"]("recmd.code_cache.CodeCache")
+    __default__: ClassVar["CodeCache | None"] = None
+
+    def __init__(self, directory: str | PurePath | None = None) -> None:
+        """directory: where to store cache, by default __pycache__ next to module is used"""
+        self.directory = None if directory is None else Path(directory)
+
+    @classmethod
+    def get(cls) -> "CodeCache | None":
+        """Current cache, None if caching is disabled"""
+        return cls.context.get(cls.__default__)
+
+    @contextmanager
+    def use(self):
+        reset = self.context.set(self)
+        try:
+            yield self
+        finally:
+            self.context.reset(reset)
+
+    @classmethod
+    def set_default(cls, cache: "CodeCache | None"):
+        cls.__default__ = cache
+
+    def path(self, function: Callable, stage: int) -> Path:
+        """stage: number of applied patchers, every stage is stored in separate file"""
+        code = function.__code__
+        file = Path(code.co_filename)
+        name = UNSAFE_CHARACTERS.sub("_", function.__qualname__)
+        tag = sys.implementation.cache_tag
+        if self.directory is None:
+            directory = file.parent / "__pycache__"
+            stem = file.stem
+        else:
+            directory = self.directory
+            digest = hashlib.sha1(str(file.absolute()).encode()).hexdigest()[:8]
+            stem = f"{file.stem}-{digest}"
+        return directory / f"{stem}.{name}.{code.co_firstlineno}.{stage}.{tag}.recmd"
+
+    def key(self, function: Callable, source_hash: bytes, patchers: Sequence[Callable]):
+        """Cache key, None if function should not be cached"""
+        keys = tuple(patcher_key(patcher) for patcher in patchers)
+        if None in keys:
+            return None
+        return (
+            MAGIC_NUMBER,
+            source_hash,
+            function.__qualname__,
+            function.__code__.co_firstlineno,
+            keys,
+        )
+
+    def load(
+        self, function: Callable, source_hash: bytes, patchers: Sequence[Callable]
+    ) -> types.CodeType | None:
+        key = self.key(function, source_hash, patchers)
+        if key is None:
+            return None
+        try:
+            data: Any = marshal.loads(self.path(function, len(patchers)).read_bytes())
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        if (
+            not isinstance(data, tuple)
+            or len(data) != 2
+            or data[0] != key
+            or not isinstance(data[1], types.CodeType)
+        ):
+            return None
+        return data[1]
+
+    def store(
+        self,
+        function: Callable,
+        source_hash: bytes,
+        patchers: Sequence[Callable],
+        code: types.CodeType,
+    ):
+        key = self.key(function, source_hash, patchers)
+        if key is None:
+            return
+        path = self.path(function, len(patchers))
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with suppress(OSError):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp.write_bytes(marshal.dumps((key, code)))
+            os.replace(temp, path)
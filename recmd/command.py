@@ -1,13 +1,36 @@
+from collections.abc import Buffer, Iterable
 from contextlib import AsyncExitStack, ExitStack
 from pathlib import PurePath
+import sys
+import time
 from typing import IO, Any, Callable, Literal, Self, cast, overload
 
 from .executor.abc import AsyncExecutor, SyncExecutor
 from .map_result import ResultMapper
-from .stream import Pipe, Capture, Send, Stream
+from .records import Records
+from .session import (
+    DEFAULT_GRACE as DEFAULT_SESSION_GRACE,
+    Framing,
+    FramingName,
+    Session,
+    SessionPool,
+)
+from .stream import (
+    CHUNK_SIZE,
+    Feed,
+    FeedSource,
+    Pipe,
+    Capture,
+    Send,
+    Stream,
+    StreamError,
+)
+from .watchdog import check_idle, observed_streams
 
 
 AnyStream = str | int | PurePath | Stream | None | IO
+DEFAULT_GRACE = 5.0
+"""Seconds between terminate and kill of timed out process"""
 
 
 class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
@@ -40,6 +63,11 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
         self.inherit_env = inherit_env
         self.environment = env or {}
         self.options = options or {}
+        self.timeout: float | None = None
+        self.idle_timeout: float | None = None
+        self.kill_grace: float = DEFAULT_GRACE
+        self.deadline: float | None = None
+        """Absolute deadline (time.monotonic), set by `CommandGroup.with_timeout`"""
 
     def did_start(self):
         return hasattr(self, "running")
@@ -103,19 +131,79 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
             assert isinstance(self.stdin, Capture)
         return self.map().apply(lambda x: x.stdout.get())  # type: ignore
 
+    def records(self, sep: bytes = b"\n", chunk_size: int = CHUNK_SIZE):
+        """
+        Iterate over stdout records split by `sep` while process is running (`for`/`async for`)
+
+        Only incomplete record is kept in memory, process is terminated if iteration stops early
+        """
+        return Records[bytes](self, sep, chunk_size=chunk_size)
+
+    @overload
+    def lines(
+        self, to_string: Literal[True] = True, encoding: str = ..., errors: str = ...
+    ) -> Records[str]: ...
+    @overload
+    def lines(
+        self, to_string: Literal[False], encoding: str = ..., errors: str = ...
+    ) -> Records[bytes]: ...
+    def lines(
+        self, to_string: bool = True, encoding: str = "utf-8", errors: str = "strict"
+    ) -> Records:
+        """Iterate over stdout lines without line endings while process is running (see `records`)"""
+
+        def convert(line: bytes):
+            line = line.removesuffix(b"\r")
+            return line.decode(encoding, errors) if to_string else line
+
+        return Records(self, b"\n", convert)
+
+    def session(
+        self,
+        framing: Framing | FramingName = "line",
+        retries: int = 0,
+        grace: float = DEFAULT_SESSION_GRACE,
+    ) -> Session:
+        """
+        Keep process running and exchange framed requests/responses with it (`request`/`request_async`)
+
+        Process is restarted after crash, failed request is retried `retries` times (see `Session`)
+        """
+        return Session(self, framing, retries, grace)
+
+    def session_pool(
+        self,
+        size: int,
+        framing: Framing | FramingName = "line",
+        retries: int = 0,
+        grace: float = DEFAULT_SESSION_GRACE,
+    ) -> SessionPool:
+        """`size` sessions of command, request is sent to idle one"""
+        return SessionPool(self, size, framing, retries, grace)
+
     def send[_PO: AnyStream, _PE: AnyStream](
-        self: "Command[None, _PO, _PE]", data: str | bytes
+        self: "Command[None, _PO, _PE]",
+        data: str | Buffer | Iterable[str | Buffer],
     ) -> "Command[Send, _PO, _PE]":
         assert self.stdin is None
 
         return self.with_stdin(Send(data))
 
+    def feed[_PO: AnyStream, _PE: AnyStream](
+        self: "Command[None, _PO, _PE]", source: FeedSource
+    ) -> "Command[Feed, _PO, _PE]":
+        """Write chunks from iterable, file object or async iterable into stdin while process is running"""
+        assert self.stdin is None
+
+        return self.with_stdin(Feed(source))
+
     def run(self):
         if self.did_start():
             if self.did_complete():
                 return self
             self.running.wait().run()
             return self
+        check_idle(self)
         with SyncExecutor.get().run(self):
             return self
 
@@ -125,6 +213,7 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
                 return self
             await self.running.wait()
             return self
+        check_idle(self)
         async with AsyncExecutor.get().run(self):
             return self
 
@@ -165,6 +254,25 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
         self.cwd = cwd
         return self
 
+    def with_timeout(
+        self,
+        timeout: float | None = None,
+        idle: float | None = None,
+        grace: float = DEFAULT_GRACE,
+    ):
+        """
+        Terminate process if it runs longer than `timeout` or produces no output for `idle` seconds
+        (process is killed if it is still running after `grace` seconds), `CommandTimeout` is raised after process end
+
+        Output is tracked only for streams that are read by current process (`Capture`, `Tee`, `lines()`, ...),
+        `StreamError` is raised on start if `idle` is passed and output of command is not tracked
+        """
+        self._assert_not_started()
+        self.timeout = timeout
+        self.idle_timeout = idle
+        self.kill_grace = grace
+        return self
+
     def with_options(self, options: dict = {}, **kwargs):
         self.options.update(options)
         self.options.update(kwargs)
@@ -216,6 +324,7 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
         return self.complete.status == 0
 
     def __enter__(self):
+        check_idle(self)
         self._ctx = SyncExecutor.get().run(self)
         self._ctx.__enter__()
 
@@ -225,6 +334,7 @@ class Command[IN: AnyStream, OUT: AnyStream, ERR: AnyStream]:
         self._ctx.__exit__(*args)
 
     async def __aenter__(self):
+        check_idle(self)
         self._actx = AsyncExecutor.get().run(self)
         await self._actx.__aenter__()
 
@@ -257,13 +367,165 @@ class RunningCommand:
 
 
 class CompleteCommand:
-    def __init__(self, status: int) -> None:
+    """
+    Exit status, wall-clock time (`time.time()` of start and end) and resource usage of finished process
+
+    `rusage` (result of `os.wait4`) is available only when executor reaps process itself (`SubprocessExecutor` on posix),
+    otherwise resource properties are None
+    """
+
+    def __init__(
+        self,
+        status: int,
+        start: float | None = None,
+        end: float | None = None,
+        rusage: Any = None,
+    ) -> None:
         self.status = status
+        self.start = start
+        self.end = end
+        self.rusage = rusage
+
+    @property
+    def duration(self) -> float | None:
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+    @property
+    def user_time(self) -> float | None:
+        return None if self.rusage is None else self.rusage.ru_utime
+
+    @property
+    def system_time(self) -> float | None:
+        return None if self.rusage is None else self.rusage.ru_stime
+
+    @property
+    def cpu_time(self) -> float | None:
+        if self.rusage is None:
+            return None
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+    @property
+    def max_rss(self) -> int | None:
+        """Peak resident set size in bytes"""
+        if self.rusage is None:
+            return None
+        # linux reports kilobytes, macOS bytes
+        return self.rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    @property
+    def voluntary_switches(self) -> int | None:
+        return None if self.rusage is None else self.rusage.ru_nvcsw
+
+    @property
+    def involuntary_switches(self) -> int | None:
+        return None if self.rusage is None else self.rusage.ru_nivcsw
+
+    @property
+    def context_switches(self) -> int | None:
+        if self.rusage is None:
+            return None
+        return self.rusage.ru_nvcsw + self.rusage.ru_nivcsw
 
 
 class CommandGroup[*C]:
     def __init__(self, *commands: *C) -> None:
         self.commands = commands
+        self.timeout: float | None = None
+
+    def with_timeout(
+        self,
+        timeout: float | None = None,
+        idle: float | None = None,
+        grace: float = DEFAULT_GRACE,
+    ):
+        """
+        Deadline for all commands of group (counted from every start of group), `grace` is applied to every command
+        that has no own timeouts (see `Command.with_timeout`)
+
+        `idle` is applied only to commands with output read by current process (output passed by `Pipe` is not tracked,
+        use `timeout` to limit producers), `StreamError` is raised if there are none
+        """
+        self.timeout = timeout
+        commands = [
+            command for command in self.commands if isinstance(command, Command)
+        ]
+        if idle is not None and not any(observed_streams(x) for x in commands):
+            raise StreamError(
+                "Output of group is not read by current process, idle timeout can't be tracked"
+            )
+        for command in commands:
+            if command.timeout is None and command.idle_timeout is None:
+                if observed_streams(command):
+                    command.idle_timeout = idle
+                command.kill_grace = grace
+        return self
+
+    def _start_deadline(self):
+        if self.timeout is None:
+            return
+        deadline = time.monotonic() + self.timeout
+        for command in self.commands:
+            assert isinstance(command, Command)
+            command.deadline = deadline
+
+    def _clear_deadline(self):
+        if self.timeout is None:
+            return
+        for command in self.commands:
+            assert isinstance(command, Command)
+            command.deadline = None
+
+    def _complete(self) -> list[CompleteCommand]:
+        result = []
+        for command in self.commands:
+            assert isinstance(command, Command) and command.did_complete(), (
+                "Commands of group did not complete"
+            )
+            result.append(command.complete)
+        return result
+
+    def _total(self, name: str):
+        values = [
+            value
+            for complete in self._complete()
+            if (value := getattr(complete, name)) is not None
+        ]
+        return sum(values) if values else None
+
+    @property
+    def user_time(self) -> float | None:
+        """Sum of user CPU time of commands (None if resource usage is not available)"""
+        return self._total("user_time")
+
+    @property
+    def system_time(self) -> float | None:
+        return self._total("system_time")
+
+    @property
+    def cpu_time(self) -> float | None:
+        return self._total("cpu_time")
+
+    @property
+    def context_switches(self) -> int | None:
+        return self._total("context_switches")
+
+    @property
+    def max_rss(self) -> int | None:
+        """Largest peak RSS of single command (commands of group run concurrently, so sum is upper bound of peak)"""
+        values = [x.max_rss for x in self._complete() if x.max_rss is not None]
+        return max(values) if values else None
+
+    @property
+    def duration(self) -> float | None:
+        """Wall-clock time from first start to last end"""
+        complete = self._complete()
+        starts = [x.start for x in complete if x.start is not None]
+        ends = [x.end for x in complete if x.end is not None]
+        if not starts or not ends:
+            return None
+        return max(ends) - min(starts)
 
     def __or__[*_C, _PI: AnyStream, _PE: AnyStream, _NO: AnyStream, _NE: AnyStream](
         self: "CommandGroup[*_C, Command[_PI, None, _PE]]",
@@ -294,6 +556,7 @@ class CommandGroup[*C]:
             return self
 
     def __enter__(self):
+        self._start_deadline()
         self._ctx = ExitStack()
         self._ctx.__enter__()
         for command in self.commands:
@@ -302,9 +565,13 @@ class CommandGroup[*C]:
         return self
 
     def __exit__(self, *args):
-        self._ctx.__exit__(*args)
+        try:
+            self._ctx.__exit__(*args)
+        finally:
+            self._clear_deadline()
 
     async def __aenter__(self):
+        self._start_deadline()
         self._actx = AsyncExitStack()
         await self._actx.__aenter__()
         for command in self.commands:
@@ -312,7 +579,10 @@ class CommandGroup[*C]:
         return self
 
     async def __aexit__(self, *args):
-        await self._actx.__aexit__(*args)
+        try:
+            await self._actx.__aexit__(*args)
+        finally:
+            self._clear_deadline()
 
     def __invert__(self):
         return self.run()
@@ -0,0 +1,136 @@
+import ast
+from pathlib import Path
+import tokenize
+from typing import Iterable
+
+from .patcher import AnyFunctionDef
+from .shell_patch import NAMES, patch_shell_arguments, string_to_list
+
+__all__ = ["COMPILED", "compile_source", "compile_file", "compile_tree"]
+
+COMPILED = "__recmd_compiled__"
+"""Module level flag set by import hook, @sh does nothing for functions from transformed modules"""
+DECORATORS = ["sh"]
+
+
+def _is_decorator(node: ast.expr, names: list[str]):
+    if isinstance(node, ast.Call):
+        node = node.func
+    return (isinstance(node, ast.Name) and node.id in names) or (
+        isinstance(node, ast.Attribute) and node.attr in names
+    )
+
+
+def _is_compiled(node: ast.expr):
+    return isinstance(node, ast.Call) and any(
+        keyword.arg == "compiled" for keyword in node.keywords
+    )
+
+
+def _compiled_flag(node: ast.expr) -> tuple[int, int, str]:
+    """Position and text of `compiled=True` argument for decorator (`@sh` -> `@sh(compiled=True)`)"""
+    assert node.end_lineno is not None and node.end_col_offset is not None
+    if not isinstance(node, ast.Call):
+        return node.end_lineno, node.end_col_offset, "(compiled=True)"
+    arguments: list[ast.expr | ast.keyword] = [*node.args, *node.keywords]
+    if not arguments:
+        return node.end_lineno, node.end_col_offset - 1, "compiled=True"
+    last = max(arguments, key=lambda x: (x.end_lineno or 0, x.end_col_offset or 0))
+    assert last.end_lineno is not None and last.end_col_offset is not None
+    return last.end_lineno, last.end_col_offset, ", compiled=True"
+
+
+def compile_source(
+    source: str, decorators: list[str] = DECORATORS, names: list[str] = NAMES
+) -> str:
+    """
+    Transform f-string arguments of `sh`/`shell` calls inside @sh functions into argument lists (see `patch_shell_arguments`)
+
+    Line numbers of original source are preserved, decorator of transformed function is marked (`@sh(compiled=True)`),
+    so it is not patched at runtime
+    """
+    tree = ast.parse(source)
+    replacements: list[tuple[ast.expr, ast.expr]] = []
+
+    def convert(node: ast.JoinedStr | ast.Constant):
+        replacement = string_to_list(node)
+        replacements.append((node, replacement))
+        return replacement
+
+    offsets = [0]
+    for line in source.encode().splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+
+    edits: list[tuple[int, int, bytes]] = []
+    for function in ast.walk(tree):
+        if not isinstance(function, AnyFunctionDef):
+            continue
+        marked = [x for x in function.decorator_list if _is_decorator(x, decorators)]
+        if not marked or any(_is_compiled(x) for x in marked):
+            continue
+        patch_shell_arguments(function, names, convert)
+        for decorator in marked:
+            line, column, text = _compiled_flag(decorator)
+            position = offsets[line - 1] + column
+            edits.append((position, position, text.encode()))
+
+    for node, replacement in replacements:
+        assert node.end_lineno is not None and node.end_col_offset is not None
+        text = ast.unparse(replacement) + "\n" * (node.end_lineno - node.lineno)
+        edits.append(
+            (
+                offsets[node.lineno - 1] + node.col_offset,
+                offsets[node.end_lineno - 1] + node.end_col_offset,
+                text.encode(),
+            )
+        )
+
+    # nested calls are already included into replacement of outer call
+    applied: list[tuple[int, int, bytes]] = []
+    for edit in sorted(edits, key=lambda x: (x[0], -x[1])):
+        if not applied or edit[0] >= applied[-1][1]:
+            applied.append(edit)
+    result = source.encode()
+    for start, stop, text in reversed(applied):
+        result = result[:start] + text + result[stop:]
+    return result.decode()
+
+
+def _read(path: Path):
+    with open(path, "rb") as file:
+        encoding, _ = tokenize.detect_encoding(file.readline)
+    return path.read_text(encoding), encoding
+
+
+def compile_file(path: Path, output: Path | None = None, write: bool = True) -> bool:
+    """Compile file inplace or into output, returns True if source was changed"""
+    source, encoding = _read(path)
+    result = compile_source(source)
+    if write and output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(result, encoding)
+    elif write and result != source:
+        path.write_text(result, encoding)
+    return result != source
+
+
+def compile_tree(
+    paths: Iterable[Path], output: Path | None = None, write: bool = True
+) -> list[Path]:
+    """
+    Compile python files (directories are scanned recursively), returns list of changed files
+
+    output: directory to write compiled files into (relative to passed paths), by default files are changed inplace
+    """
+    changed = []
+    for root in paths:
+        files = sorted(root.rglob("*.py")) if root.is_dir() else [root]
+        for file in files:
+            target = None
+            if output is not None:
+                target = output / (
+                    file.relative_to(root) if root.is_dir() else file.name
+                )
+            if compile_file(file, target, write):
+                changed.append(file)
+    return changed
@@ -1,2 +1,52 @@
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .command import Command
+
+
 class TransformError(RuntimeError):
     pass
+
+
+class CommandTimeout(TimeoutError):
+    """Command was stopped by timeout, deadline of group or inactivity watchdog"""
+
+    def __init__(self, command: "Command", reason: str, limit: float | None) -> None:
+        if reason == "idle":
+            message = f"No output from {command.cmd} for {limit}s"
+        elif limit is None:
+            message = f"Deadline of {command.cmd} is exceeded"
+        else:
+            message = f"{command.cmd} did not complete in {limit}s"
+        super().__init__(message)
+        self.command = command
+        self.reason = reason
+        self.limit = limit
+
+    @staticmethod
+    def _output(stream: Any) -> bytes | str | None:
+        if hasattr(stream, "get"):
+            try:
+                return stream.get()
+            except AttributeError:
+                return None
+        return None
+
+    @property
+    def stdout(self):
+        """Partial output if stdout is captured"""
+        return self._output(self.command.stdout)
+
+    @property
+    def stderr(self):
+        """Partial output if stderr is captured"""
+        return self._output(self.command.stderr)
+
+
+class SessionError(RuntimeError):
+    """Process of session exited or closed its streams while request was processed"""
+
+    def __init__(self, command: "Command", status: int | None, message: str) -> None:
+        super().__init__(message)
+        self.command = command
+        self.status = status
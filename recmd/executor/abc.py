@@ -3,6 +3,7 @@ from contextlib import contextmanager
 from contextvars import ContextVar
 from typing import TYPE_CHECKING, AsyncContextManager, ClassVar, ContextManager
 
+from recmd.executor.hooks import Hooks
 
 if TYPE_CHECKING:
     from recmd.command import Command
@@ -12,6 +13,14 @@ class AsyncExecutor(ABC):
     context: ClassVar = ContextVar["AsyncExecutor"]("recmd.executor.AsyncExecutor")
     __default__: ClassVar["AsyncExecutor | None"] = None
 
+    hooks: Hooks
+    """Lifecycle hooks of commands run by executor"""
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.hooks = Hooks()
+
     @classmethod
     def get(cls) -> "AsyncExecutor":
         self = cls.context.get(None)
@@ -46,10 +55,14 @@ class SyncExecutor(ABC):
     implicit_start: bool
     """Allow process to be started via assert"""
 
+    hooks: Hooks
+    """Lifecycle hooks of commands run by executor"""
+
     def __init__(self, implicit_start: bool = False) -> None:
         super().__init__()
 
         self.implicit_start = implicit_start
+        self.hooks = Hooks()
 
     @classmethod
     def get(cls) -> "SyncExecutor":
@@ -1,18 +1,29 @@
-from contextlib import AsyncExitStack, asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 import os
 from pathlib import PurePath
+import time
 
 from anyio import create_task_group
 import anyio.abc
 from recmd.command import AnyStream, Command, CompleteCommand, RunningCommand
 from recmd.executor.abc import AsyncExecutor
+from recmd.executor.spawn_cache import SpawnCache
 from recmd.stream import FileStream, Stream, StreamName, AsyncIO
+from recmd.watchdog import Watchdog
 
 
 class AnyioExecutor(AsyncExecutor):
+    def __init__(self, spawn_cache: SpawnCache | None = None) -> None:
+        super().__init__()
+        self.spawn_cache = spawn_cache or SpawnCache()
+
     @asynccontextmanager
     async def run(self, command: Command):
+        hooks = self.hooks if self.hooks else None
         async with AsyncExitStack() as stack:
+            if hooks is not None:
+                hooks.emit("prepare", command)
+                stack.callback(hooks.emit, "closed", command)
             stdin, stdin_stream = await self.prepare_stream(command.stdin, "stdin")
             stack.push_async_callback(self.close_stream, stdin_stream)
             stdout, stdout_stream = await self.prepare_stream(command.stdout, "stdout")
@@ -20,34 +31,60 @@ class AnyioExecutor(AsyncExecutor):
             stderr, stderr_stream = await self.prepare_stream(command.stderr, "stderr")
             stack.push_async_callback(self.close_stream, stderr_stream)
 
-            env = command.environment
-            if command.inherit_env:
-                env = os.environ | env
+            env = self.spawn_cache.environment(command.environment, command.inherit_env)
+            start = time.time()
             process = await anyio.open_process(
                 command.cmd,
                 stdin=stdin,
                 stdout=stdout,
                 stderr=stderr,
-                env=env,
+                env=None if env is os.environ else env,
                 cwd=command.cwd,
                 **command.options,
             )
 
             command.running = RunningCommand(process.pid, process)
+            if hooks is not None:
+                hooks.emit("spawned", command, pid=process.pid)
+                hooks.watch_stream(command, stdout_stream, "stdout")
+                hooks.watch_stream(command, stderr_stream, "stderr")
 
             await self.setup_stream(stdin_stream, (process.stdin, "stdin"))
             await self.setup_stream(stdout_stream, (process.stdout, "stdout"))
             await self.setup_stream(stderr_stream, (process.stderr, "stderr"))
 
+            watchdog = Watchdog.create(command)
             try:
                 async with create_task_group() as tg:
                     tg.start_soon(self.process_stream, stdin_stream)
                     tg.start_soon(self.process_stream, stdout_stream)
                     tg.start_soon(self.process_stream, stderr_stream)
+                    if watchdog is not None:
+                        tg.start_soon(self.watch, watchdog, process)
                     yield
             finally:
                 status = await process.wait()
-                command.complete = CompleteCommand(status)
+                if hooks is not None:
+                    hooks.emit("exit", command, pid=process.pid, status=status)
+                # process is reaped by event loop, so resource usage is not available
+                command.complete = CompleteCommand(status, start, time.time())
+        # streams are closed, so partial output is available
+        if watchdog is not None and watchdog.reason is not None:
+            raise watchdog.error()
+
+    async def watch(self, watchdog: Watchdog, process: anyio.abc.Process):
+        """Terminates (and then kills) process when watchdog fires, returns when process exits"""
+        while (delay := watchdog.check()) is not None:
+            with anyio.move_on_after(delay):
+                await process.wait()
+                return
+        with suppress(ProcessLookupError):
+            process.terminate()
+        with anyio.move_on_after(watchdog.grace):
+            await process.wait()
+            return
+        with suppress(ProcessLookupError):
+            process.kill()
 
     async def setup_stream(self, stream: Stream | None, io: AsyncIO):
         if stream is None or io is None:
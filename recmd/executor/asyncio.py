@@ -0,0 +1,339 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+import os
+from pathlib import PurePath
+import time
+from typing import Any, AsyncIterable, Iterator, Sequence, cast
+
+from recmd.command import AnyStream, Command, CompleteCommand, RunningCommand
+from recmd.executor.abc import AsyncExecutor
+from recmd.executor.spawn_cache import SpawnCache
+from recmd.stream import (
+    CHUNK_SIZE,
+    Capture,
+    Feed,
+    FileStream,
+    IOStream,
+    Stream,
+    StreamError,
+    StreamName,
+)
+from recmd.watchdog import Watchdog
+
+__all__ = ["AsyncioExecutor", "AsyncioProcess"]
+
+
+class CommandProtocol(asyncio.SubprocessProtocol):
+    """Passes output into `Capture` streams and writes stdin from transport callbacks"""
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, outputs: dict[int, Capture]
+    ) -> None:
+        self.loop = loop
+        self.outputs = outputs
+        self.writer: StdinWriter | None = None
+        self.paused = False
+        self._drain: asyncio.Future | None = None
+        self.exited = loop.create_future()
+        self.closed = loop.create_future()
+
+    def pipe_data_received(self, fd: int, data: bytes):
+        stream = self.outputs.get(fd)
+        if stream is not None:
+            stream.feed_data(data)
+
+    def pipe_connection_lost(self, fd: int, exc: Exception | None):
+        if fd == 0:
+            # process closed stdin, writer stops on closed transport
+            self._wake()
+        elif (stream := self.outputs.pop(fd, None)) is not None:
+            stream.feed_eof()
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self._wake()
+        if self.writer is not None:
+            # transport is not ready to be closed from this callback
+            self.loop.call_soon(self.writer.write)
+
+    def _wake(self):
+        if self._drain is not None and not self._drain.done():
+            self._drain.set_result(None)
+
+    async def drain(self):
+        """Wait until stdin transport accepts more data"""
+        if self.paused:
+            self._drain = self.loop.create_future()
+            await self._drain
+
+    def process_exited(self):
+        if not self.exited.done():
+            self.exited.set_result(None)
+
+    def connection_lost(self, exc: Exception | None):
+        # process exited and all pipes are closed
+        self.process_exited()
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class StdinWriter:
+    """Writes chunks of `Feed` with in-memory source (`Send`, sequences) from protocol callbacks"""
+
+    def __init__(
+        self, stream: Feed, transport: asyncio.WriteTransport, protocol: CommandProtocol
+    ) -> None:
+        self.encoding = stream.encoding
+        self.source = stream.source
+        self.chunks = self._slices()
+        self.transport = transport
+        self.protocol = protocol
+
+    def _slices(self) -> Iterator[memoryview]:
+        # transport copies data that was not written immediately, so large buffers are passed in parts
+        for chunk in self.source:  # type: ignore
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self.encoding)
+            view = memoryview(chunk).cast("B")
+            for offset in range(0, view.nbytes, CHUNK_SIZE):
+                yield view[offset : offset + CHUNK_SIZE]
+
+    def write(self):
+        """Write until transport is paused or source ends (called again by `resume_writing`)"""
+        while not self.protocol.paused and not self.transport.is_closing():
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                # buffered data is flushed before pipe is closed
+                self.transport.close()
+                return
+            self.transport.write(chunk)
+
+
+class AsyncioProcess:
+    """Subset of `subprocess.Popen` interface (with async wait) for `asyncio.SubprocessTransport`"""
+
+    def __init__(
+        self, transport: asyncio.SubprocessTransport, protocol: CommandProtocol
+    ) -> None:
+        self.transport = transport
+        self.protocol = protocol
+        self.pid = transport.get_pid()
+
+    @property
+    def returncode(self) -> int | None:
+        return self.transport.get_returncode()
+
+    def poll(self) -> int | None:
+        return self.returncode
+
+    async def wait(self) -> int:
+        await asyncio.shield(self.protocol.exited)
+        returncode = self.returncode
+        assert returncode is not None
+        return returncode
+
+    def send_signal(self, sig: int):
+        self.transport.send_signal(sig)
+
+    def terminate(self):
+        self.transport.terminate()
+
+    def kill(self):
+        self.transport.kill()
+
+
+class WatchdogTimer:
+    """Terminates (and then kills) process when watchdog fires, checks are scheduled with `loop.call_later`"""
+
+    def __init__(
+        self,
+        watchdog: Watchdog,
+        process: AsyncioProcess,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        self.watchdog = watchdog
+        self.process = process
+        self.loop = loop
+        self.handle: asyncio.TimerHandle | asyncio.Handle | None = None
+
+    def start(self):
+        self.handle = self.loop.call_soon(self.check)
+
+    def check(self):
+        if self.process.returncode is not None:
+            return
+        delay = self.watchdog.check()
+        if delay is not None:
+            self.handle = self.loop.call_later(delay, self.check)
+            return
+        with suppress(ProcessLookupError):
+            self.process.terminate()
+        self.handle = self.loop.call_later(self.watchdog.grace, self.kill)
+
+    def kill(self):
+        if self.process.returncode is None:
+            with suppress(ProcessLookupError):
+                self.process.kill()
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+
+
+class AsyncioExecutor(AsyncExecutor):
+    """
+    Executor based on `loop.subprocess_exec` (works with any asyncio event loop, for example uvloop), anyio is not required
+
+    Output of `Capture` streams is received and stdin of `Send` is written in protocol callbacks, tasks are started only
+    for streams that need them (`Feed` with generators, files or async iterables, `Tee`, `SendFile`).
+    Streams that expose raw async streams (`IOStream`, `Command.lines()`) require `AnyioExecutor`
+    """
+
+    def __init__(self, spawn_cache: SpawnCache | None = None) -> None:
+        super().__init__()
+        self.spawn_cache = spawn_cache or SpawnCache()
+
+    @asynccontextmanager
+    async def run(self, command: Command):
+        hooks = self.hooks if self.hooks else None
+        loop = asyncio.get_running_loop()
+        async with AsyncExitStack() as stack:
+            if hooks is not None:
+                hooks.emit("prepare", command)
+                stack.callback(hooks.emit, "closed", command)
+            stdin, stdin_stream = await self.prepare_stream(command.stdin, "stdin")
+            stack.push_async_callback(self.close_stream, stdin_stream)
+            stdout, stdout_stream = await self.prepare_stream(command.stdout, "stdout")
+            stack.push_async_callback(self.close_stream, stdout_stream)
+            stderr, stderr_stream = await self.prepare_stream(command.stderr, "stderr")
+            stack.push_async_callback(self.close_stream, stderr_stream)
+
+            protocol = CommandProtocol(
+                loop,
+                {
+                    fd: stream
+                    for fd, stream in ((1, stdout_stream), (2, stderr_stream))
+                    if isinstance(stream, Capture)
+                },
+            )
+            env = self.spawn_cache.environment(command.environment, command.inherit_env)
+            options: dict[str, Any] = command.options
+            if os.name == "posix" and not {"executable", "shell"} & options.keys():
+                options = options | {
+                    "executable": self.spawn_cache.executable(command.cmd[0], env)
+                }
+            if hooks is not None:
+                # output may be received before subprocess_exec returns
+                hooks.watch_stream(command, stdout_stream, "stdout")
+                hooks.watch_stream(command, stderr_stream, "stderr")
+            start = time.time()
+            transport, _ = await loop.subprocess_exec(
+                lambda: protocol,
+                *command.cmd,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                env=None if env is os.environ else env,
+                cwd=command.cwd,
+                **options,
+            )
+            stack.callback(transport.close)
+            process = AsyncioProcess(transport, protocol)
+            command.running = RunningCommand(process.pid, process)
+            if hooks is not None:
+                hooks.emit("spawned", command, pid=process.pid)
+
+            tasks = [
+                task
+                for name, stream in (
+                    ("stdin", stdin_stream),
+                    ("stdout", stdout_stream),
+                    ("stderr", stderr_stream),
+                )
+                if (task := await self.start_stream(stream, name, transport, protocol))
+                is not None
+            ]
+            watchdog = Watchdog.create(command)
+            timer = None
+            if watchdog is not None:
+                timer = WatchdogTimer(watchdog, process, loop)
+                timer.start()
+            try:
+                yield
+            finally:
+                await asyncio.shield(protocol.closed)
+                status = transport.get_returncode()
+                assert status is not None
+                end = time.time()
+                if hooks is not None:
+                    hooks.emit("exit", command, pid=process.pid, status=status)
+                if timer is not None:
+                    timer.stop()
+                errors = await asyncio.gather(*tasks, return_exceptions=True)
+                command.complete = CompleteCommand(status, start, end)
+            for error in errors:
+                if isinstance(error, BaseException):
+                    raise error
+        # streams are closed, so partial output is available
+        if watchdog is not None and watchdog.reason is not None:
+            raise watchdog.error()
+
+    async def start_stream(
+        self,
+        stream: Stream | None,
+        name: StreamName,
+        transport: asyncio.SubprocessTransport,
+        protocol: CommandProtocol,
+    ) -> asyncio.Task | None:
+        """Connect stream to process, returns task if stream can't be handled in protocol callbacks"""
+        if stream is None or isinstance(stream, Capture):
+            return None
+        if isinstance(stream, Feed):
+            # uvloop transports are not subclasses of asyncio.WriteTransport
+            pipe = cast(asyncio.WriteTransport, transport.get_pipe_transport(0))
+            if isinstance(stream.source, Sequence):
+                protocol.writer = StdinWriter(stream, pipe, protocol)
+                protocol.writer.write()
+                return None
+            return asyncio.ensure_future(self.feed(stream, pipe, protocol))
+        await stream.init_async((None, name))  # type: ignore
+        if type(stream).process_async is Stream.process_async:
+            return None
+        return asyncio.ensure_future(stream.process_async())
+
+    async def feed(
+        self, stream: Feed, pipe: asyncio.WriteTransport, protocol: CommandProtocol
+    ):
+        """Write chunks of generator, file or async iterable (blocking sources are read in thread)"""
+        try:
+            chunks = stream.source
+            if not isinstance(chunks, AsyncIterable):
+                chunks = stream.chunks_async()
+            async for chunk in chunks:
+                if pipe.is_closing():
+                    break
+                if isinstance(chunk, str):
+                    chunk = chunk.encode(stream.encoding)
+                pipe.write(chunk)
+                await protocol.drain()
+        finally:
+            pipe.close()
+
+    async def close_stream(self, stream: Stream | None):
+        if stream is None:
+            return
+        await stream.close_async()
+
+    async def prepare_stream(self, stream: AnyStream, name: StreamName) -> Any:
+        if isinstance(stream, str | PurePath):
+            stream = FileStream(stream)
+        if isinstance(stream, IOStream) and not isinstance(stream, Capture | Feed):
+            raise StreamError(
+                f"{type(stream).__name__} requires async stream, use AnyioExecutor"
+            )
+        if isinstance(stream, Stream):
+            return await stream.setup_async(name), stream
+        return stream, None
@@ -0,0 +1,95 @@
+import time
+from typing import TYPE_CHECKING, Callable, Literal
+
+if TYPE_CHECKING:
+    from recmd.command import Command
+    from recmd.stream import Stream, StreamName
+
+__all__ = ["Hook", "HookEvent", "HookName", "Hooks"]
+
+HookName = Literal["prepare", "spawned", "first_byte", "exit", "closed"]
+"""
+- prepare: executor starts to prepare streams of command
+- spawned: process is started (`pid`)
+- first_byte: first chunk of output is received (`stream`), only for streams read by current process
+- exit: process exited (`status`)
+- closed: streams of command are closed, output is complete
+"""
+
+
+class HookEvent:
+    """Lifecycle event of command, `time` is `time.monotonic()`"""
+
+    __slots__ = ("name", "command", "time", "pid", "stream", "status")
+
+    def __init__(
+        self,
+        name: HookName,
+        command: "Command",
+        time: float,
+        pid: int | None = None,
+        stream: "StreamName | None" = None,
+        status: int | None = None,
+    ) -> None:
+        self.name = name
+        self.command = command
+        self.time = time
+        self.pid = pid
+        self.stream = stream
+        self.status = status
+
+    def __repr__(self) -> str:
+        return f"HookEvent({self.name!r}, {self.command.cmd!r}, time={self.time})"
+
+
+type Hook = Callable[[HookEvent], None]
+
+
+class Hooks:
+    """
+    Hooks of executor, called synchronously in thread (or task) that runs command, so they should be fast
+
+    Executors check registry before creating events, so there is no overhead without hooks
+    """
+
+    def __init__(self) -> None:
+        self._hooks: tuple[Hook, ...] = ()
+
+    def add(self, hook: Hook) -> Callable[[], None]:
+        """Register hook, returns function that removes it"""
+        self._hooks += (hook,)
+        return lambda: self.remove(hook)
+
+    def remove(self, hook: Hook):
+        hooks = list(self._hooks)
+        hooks.remove(hook)
+        self._hooks = tuple(hooks)
+
+    def __bool__(self) -> bool:
+        return bool(self._hooks)
+
+    def emit(
+        self,
+        name: HookName,
+        command: "Command",
+        pid: int | None = None,
+        stream: "StreamName | None" = None,
+        status: int | None = None,
+        at: float | None = None,
+    ):
+        event = HookEvent(
+            name, command, time.monotonic() if at is None else at, pid, stream, status
+        )
+        # registry is replaced on change, so hooks can be added from other threads while iterating
+        for hook in self._hooks:
+            hook(event)
+
+    def watch_stream(
+        self, command: "Command", stream: "Stream | None", name: "StreamName"
+    ):
+        """Emit first_byte event when stream receives output (see `Stream.touch`)"""
+        if stream is None:
+            return
+        stream.on_first_byte = lambda at: self.emit(
+            "first_byte", command, stream=name, at=at
+        )
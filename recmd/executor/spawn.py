@@ -0,0 +1,154 @@
+import os
+import signal
+import subprocess
+import threading
+from typing import IO, Any
+
+from recmd.command import Command
+from recmd.executor.subprocess import SubprocessExecutor
+
+__all__ = ["SpawnExecutor", "SpawnedProcess"]
+
+SUPPORTED_OPTIONS = {"start_new_session", "process_group"}
+"""Popen options that can be expressed using posix_spawn"""
+RESTORED_SIGNALS = tuple(
+    getattr(signal, name) for name in ("SIGPIPE", "SIGXFSZ") if hasattr(signal, name)
+)
+"""Signals ignored by python that are reset to default in child (as `Popen(restore_signals=True)` does)"""
+
+
+class SpawnedProcess:
+    """Subset of `subprocess.Popen` interface for process started by `os.posix_spawn`"""
+
+    def __init__(
+        self,
+        args: list[str],
+        pid: int,
+        stdin: IO[bytes] | None,
+        stdout: IO[bytes] | None,
+        stderr: IO[bytes] | None,
+    ) -> None:
+        self.args = args
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        # same name as in Popen, it is used by SubprocessExecutor.wait
+        self._waitpid_lock = threading.Lock()
+
+    def _wait(self, options: int):
+        if self.returncode is not None:
+            return self.returncode
+        try:
+            pid, status = os.waitpid(self.pid, options)
+        except ChildProcessError:
+            # process was reaped by someone else
+            self.returncode = 0
+            return self.returncode
+        if pid == self.pid:
+            self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def poll(self) -> int | None:
+        # like Popen._internal_poll, lock is held by thread that waits for process (SubprocessExecutor.wait)
+        if not self._waitpid_lock.acquire(False):
+            return None
+        try:
+            return self._wait(os.WNOHANG)
+        finally:
+            self._waitpid_lock.release()
+
+    def wait(self) -> int:
+        with self._waitpid_lock:
+            result = self._wait(0)
+        assert result is not None
+        return result
+
+    def send_signal(self, sig: int):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class SpawnExecutor(SubprocessExecutor):
+    """
+    Starts processes using `os.posix_spawn` instead of fork+exec, so spawn time does not depend on memory usage of parent
+
+    Falls back to `Popen` when command requires something posix_spawn can't do (cwd, most Popen options) or platform has no posix_spawn.
+    Unlike `Popen`, descriptors are not closed in child explicitly (python creates non-inheritable descriptors by default)
+    """
+
+    def supports(self, command: Command) -> bool:
+        return (
+            hasattr(os, "posix_spawn")
+            and command.cwd is None
+            and set(command.options) <= SUPPORTED_OPTIONS
+        )
+
+    def spawn(self, command: Command, stdin: Any, stdout: Any, stderr: Any):
+        if not self.supports(command):
+            return super().spawn(command, stdin, stdout, stderr)
+
+        env = self.spawn_cache.environment(command.environment, command.inherit_env)
+        actions: list[tuple] = []
+        parent: list[IO[bytes] | None] = []
+        # descriptors that should be closed in parent after spawn
+        child: list[int] = []
+        try:
+            for target, value in enumerate((stdin, stdout, stderr)):
+                parent.append(self._file_action(target, value, actions, child))
+            options = {}
+            if command.options.get("start_new_session"):
+                options["setsid"] = True
+            if (group := command.options.get("process_group")) is not None:
+                options["setpgroup"] = group
+            pid = os.posix_spawn(
+                self.spawn_cache.executable(command.cmd[0], env),
+                command.cmd,
+                env,
+                file_actions=actions,
+                setsigdef=RESTORED_SIGNALS,
+                **options,
+            )
+        except BaseException:
+            for file in parent:
+                if file is not None:
+                    file.close()
+            raise
+        finally:
+            for descriptor in child:
+                os.close(descriptor)
+        return SpawnedProcess(command.cmd, pid, *parent)
+
+    def _file_action(
+        self, target: int, value: Any, actions: list[tuple], child: list[int]
+    ) -> IO[bytes] | None:
+        """Add posix_spawn file action for stdio descriptor, returns parent end of pipe"""
+        if value is None:
+            return None
+        if value == subprocess.PIPE:
+            read, write = os.pipe()
+            if target == 0:
+                child.append(read)
+                actions.append((os.POSIX_SPAWN_DUP2, read, target))
+                return open(write, "wb")
+            child.append(write)
+            actions.append((os.POSIX_SPAWN_DUP2, write, target))
+            return open(read, "rb")
+        if value == subprocess.DEVNULL:
+            flags = os.O_RDONLY if target == 0 else os.O_WRONLY
+            actions.append((os.POSIX_SPAWN_OPEN, target, os.devnull, flags, 0))
+            return None
+        if value == subprocess.STDOUT:
+            assert target == 2, "STDOUT can be used only for stderr"
+            actions.append((os.POSIX_SPAWN_DUP2, 1, target))
+            return None
+        descriptor = value if isinstance(value, int) else value.fileno()
+        actions.append((os.POSIX_SPAWN_DUP2, descriptor, target))
+        return None
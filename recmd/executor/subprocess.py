@@ -1,17 +1,69 @@
-from contextlib import ExitStack, contextmanager
+from contextlib import ExitStack, contextmanager, nullcontext, suppress
 import os
 from pathlib import PurePath
 from subprocess import Popen
-from typing import IO
+from threading import Event, Thread
+import time
+from typing import IO, Any
 from recmd.command import AnyStream, Command, CompleteCommand, RunningCommand
 from recmd.executor.abc import SyncExecutor
+from recmd.executor.spawn_cache import SpawnCache
 from recmd.stream import FileStream, Stream, StreamName
+from recmd.watchdog import Watchdog
+
+
+class StreamThread(Thread):
+    error: BaseException | None = None
+
+    def __init__(self, stream: Stream) -> None:
+        super().__init__(name=f"recmd-{type(stream).__name__}", daemon=True)
+        self.stream = stream
+
+    def run(self):
+        try:
+            self.stream.process()
+        except BaseException as e:
+            self.error = e
+
+
+class WatchdogThread(Thread):
+    """Terminates (and then kills) process when watchdog fires"""
+
+    def __init__(self, watchdog: Watchdog, process: Any) -> None:
+        super().__init__(name="recmd-watchdog", daemon=True)
+        self.watchdog = watchdog
+        self.process = process
+        self.stopped = Event()
+
+    def run(self):
+        while (delay := self.watchdog.check()) is not None:
+            if self.stopped.wait(delay):
+                return
+        with suppress(ProcessLookupError):
+            self.process.terminate()
+        if not self.stopped.wait(self.watchdog.grace):
+            with suppress(ProcessLookupError):
+                self.process.kill()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
 
 
 class SubprocessExecutor(SyncExecutor):
+    def __init__(
+        self, implicit_start: bool = False, spawn_cache: SpawnCache | None = None
+    ) -> None:
+        super().__init__(implicit_start)
+        self.spawn_cache = spawn_cache or SpawnCache()
+
     @contextmanager
     def run(self, command: Command):
+        hooks = self.hooks if self.hooks else None
         with ExitStack() as stack:
+            if hooks is not None:
+                hooks.emit("prepare", command)
+                stack.callback(hooks.emit, "closed", command)
             stdin, stdin_stream = self.prepare_stream(command.stdin, "stdin")
             stack.callback(self.close_stream, stdin_stream)
             stdout, stdout_stream = self.prepare_stream(command.stdout, "stdout")
@@ -19,28 +71,83 @@ class SubprocessExecutor(SyncExecutor):
             stderr, stderr_stream = self.prepare_stream(command.stderr, "stderr")
             stack.callback(self.close_stream, stderr_stream)
 
-            env = command.environment
-            if command.inherit_env:
-                env = os.environ | env
-            process = Popen(
-                command.cmd,
-                stdin=stdin,
-                stdout=stdout,
-                stderr=stderr,
-                env=env,
-                cwd=command.cwd,
-                **command.options,
-            )
+            start = time.time()
+            process = self.spawn(command, stdin, stdout, stderr)
             command.running = RunningCommand(process.pid, process)
+            if hooks is not None:
+                hooks.emit("spawned", command, pid=process.pid)
+                hooks.watch_stream(command, stdout_stream, "stdout")
+                hooks.watch_stream(command, stderr_stream, "stderr")
 
             self.setup_stream(stdin_stream, process.stdin, "stdin")
             self.setup_stream(stdout_stream, process.stdout, "stdout")
             self.setup_stream(stderr_stream, process.stderr, "stderr")
+            threads = [
+                self.process_stream(stream)
+                for stream in (stdin_stream, stdout_stream, stderr_stream)
+            ]
+            watchdog = self.start_watchdog(command, process)
             try:
                 yield
             finally:
-                status = process.wait()
-                command.complete = CompleteCommand(status)
+                status, rusage = self.wait(process)
+                end = time.time()
+                if hooks is not None:
+                    hooks.emit("exit", command, pid=process.pid, status=status)
+                if watchdog is not None:
+                    watchdog.stop()
+                for thread in threads:
+                    if thread is not None:
+                        thread.join()
+                command.complete = CompleteCommand(status, start, end, rusage)
+            for thread in threads:
+                if thread is not None and thread.error is not None:
+                    raise thread.error
+        # streams are closed, so partial output is available
+        if watchdog is not None and watchdog.watchdog.reason is not None:
+            raise watchdog.watchdog.error()
+
+    def wait(self, process: Any) -> tuple[int, Any]:
+        """Wait for process exit, reaps it with `os.wait4` to get resource usage when it is possible"""
+        rusage = None
+        if hasattr(os, "wait4"):
+            # same lock as Popen.wait/poll, so process is not reaped concurrently
+            with getattr(process, "_waitpid_lock", nullcontext()):
+                if process.returncode is None:
+                    try:
+                        _, status, rusage = os.wait4(process.pid, 0)
+                    except ChildProcessError:
+                        pass
+                    else:
+                        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.wait(), rusage
+
+    def start_watchdog(self, command: Command, process: Any):
+        watchdog = Watchdog.create(command)
+        if watchdog is None:
+            return None
+        thread = WatchdogThread(watchdog, process)
+        thread.start()
+        return thread
+
+    def spawn(self, command: Command, stdin: Any, stdout: Any, stderr: Any) -> Popen:
+        """Start process, stdio arguments are results of `Stream.setup` (or passed as is)"""
+        env = self.spawn_cache.environment(command.environment, command.inherit_env)
+        options: dict[str, Any] = command.options
+        if os.name == "posix" and not {"executable", "shell"} & options.keys():
+            options = options | {
+                "executable": self.spawn_cache.executable(command.cmd[0], env)
+            }
+        return Popen(
+            command.cmd,
+            stdin=stdin,
+            stdout=stdout,
+            stderr=stderr,
+            # environment of current process is inherited without copying
+            env=None if env is os.environ else env,
+            cwd=command.cwd,
+            **options,
+        )
 
     def setup_stream(
         self, stream: Stream | None, io: IO[bytes] | None, name: StreamName
@@ -49,6 +156,14 @@ class SubprocessExecutor(SyncExecutor):
             return
         stream.init((io, name))
 
+    def process_stream(self, stream: Stream | None):
+        """Run Stream.process in separate thread if it is implemented"""
+        if stream is None or type(stream).process is Stream.process:
+            return None
+        thread = StreamThread(stream)
+        thread.start()
+        return thread
+
     def close_stream(self, stream: Stream | None):
         if stream is None:
             return
@@ -0,0 +1,127 @@
+import ast
+from contextlib import suppress
+import hashlib
+from importlib.abc import MetaPathFinder
+from importlib.machinery import PathFinder, SourceFileLoader
+from importlib.util import MAGIC_NUMBER, cache_from_source
+import marshal
+import sys
+import types
+from typing import Iterable
+
+from .code_cache import patcher_key
+from .compiler import COMPILED
+from .shell_patch import patch_shell_arguments
+
+__all__ = ["ShellLoader", "ShellFinder", "install", "uninstall"]
+
+OPTIMIZATION = "recmd"
+"""Transformed modules are cached in __pycache__ as <name>.<tag>.opt-recmd[level].pyc"""
+
+
+def optimization() -> str:
+    """Cache tag for current optimization level (-O/-OO remove asserts and docstrings)"""
+    return f"{OPTIMIZATION}{sys.flags.optimize or ''}"
+
+
+def _is_header(node: ast.stmt, first: bool):
+    return (
+        first
+        and isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    ) or (isinstance(node, ast.ImportFrom) and node.module == "__future__")
+
+
+def transform_module(tree: ast.Module):
+    """Apply `patch_shell_arguments` to whole module and mark it as compiled (so @sh does nothing)"""
+    patch_shell_arguments(tree)
+    index = 0
+    while index < len(tree.body) and _is_header(tree.body[index], index == 0):
+        index += 1
+    marker = ast.Assign(
+        targets=[ast.Name(id=COMPILED, ctx=ast.Store())], value=ast.Constant(True)
+    )
+    if tree.body:
+        ast.copy_location(marker, tree.body[min(index, len(tree.body) - 1)])
+    tree.body.insert(index, marker)
+    return ast.fix_missing_locations(tree)
+
+
+class ShellLoader(SourceFileLoader):
+    """Source loader that transforms whole module once, result is cached like regular bytecode"""
+
+    def source_to_code(self, data, path, *, _optimize=-1):  # type: ignore
+        tree = transform_module(ast.parse(data, path))
+        return compile(tree, path, "exec", dont_inherit=True, optimize=_optimize)
+
+    def _header(self, source_path: str):
+        stats = self.path_stats(source_path)
+        key = hashlib.sha1(str(patcher_key(patch_shell_arguments)).encode())
+        return (
+            MAGIC_NUMBER
+            + (int(stats["mtime"]) & 0xFFFFFFFF).to_bytes(4, "little")
+            + (int(stats["size"]) & 0xFFFFFFFF).to_bytes(4, "little")
+            + key.digest()[:8]
+        )
+
+    def get_code(self, fullname: str):
+        source_path = self.get_filename(fullname)
+        bytecode_path = cache_from_source(source_path, optimization=optimization())
+        header = self._header(source_path)
+        with suppress(OSError, ValueError, EOFError, TypeError):
+            data = self.get_data(bytecode_path)
+            if data[: len(header)] == header:
+                code = marshal.loads(memoryview(data)[len(header) :])
+                if isinstance(code, types.CodeType):
+                    return code
+
+        code = self.source_to_code(self.get_data(source_path), source_path)
+        if not sys.dont_write_bytecode:
+            self.set_data(bytecode_path, header + marshal.dumps(code))
+        return code
+
+
+class ShellFinder(MetaPathFinder):
+    """Loads modules of selected packages using `ShellLoader`"""
+
+    def __init__(self, packages: Iterable[str]) -> None:
+        self.packages = set(packages)
+
+    def find_spec(self, fullname, path, target=None):
+        if not any(
+            fullname == package or fullname.startswith(f"{package}.")
+            for package in self.packages
+        ):
+            return None
+        spec = PathFinder.find_spec(fullname, path, target)
+        if (
+            spec is None
+            or spec.origin is None
+            or not isinstance(spec.loader, SourceFileLoader)
+        ):
+            return spec
+        spec.loader = ShellLoader(fullname, spec.origin)
+        spec.cached = cache_from_source(spec.origin, optimization=optimization())
+        return spec
+
+
+def install(*packages: str) -> ShellFinder:
+    """Transform modules of packages (and their subpackages) on import, should be called before they are imported"""
+    for finder in sys.meta_path:
+        if isinstance(finder, ShellFinder):
+            finder.packages.update(packages)
+            return finder
+    finder = ShellFinder(packages)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(*packages: str):
+    """Stop transforming modules of packages, all packages if none are passed"""
+    for finder in [*sys.meta_path]:
+        if not isinstance(finder, ShellFinder):
+            continue
+        finder.packages.difference_update(packages)
+        if not packages or not finder.packages:
+            sys.meta_path.remove(finder)
@@ -1,9 +1,18 @@
 import ast
+from collections import OrderedDict
 from contextlib import suppress
+from copy import deepcopy
+from functools import cached_property
+from importlib.util import source_hash
 import inspect
+import os
 import sys
+import threading
 import types
-from typing import TYPE_CHECKING, Annotated, Any, Callable, Concatenate
+import weakref
+from typing import TYPE_CHECKING, Annotated, Any, Callable, ClassVar, Concatenate
+
+from .code_cache import CodeCache
 
 try:
     from typing_extensions import Doc  # type: ignore
@@ -21,6 +30,9 @@ __all__ = [
     "AnyFunctionDef",
     "line_attributes",
     "get_ast",
+    "queue_patch",
+    "lazy_patch",
+    "ModuleIndex",
 ]
 
 AnyFunctionDef = ast.FunctionDef | ast.AsyncFunctionDef
@@ -43,39 +55,80 @@ def getsource(obj):
     return inspect.getsource(sys.modules[obj.__module__])
 
 
+def _stamp(filename: str):
+    with suppress(OSError):
+        stat = os.stat(filename)
+        return stat.st_mtime_ns, stat.st_size
+
+
+class ModuleIndex:
+    """Parsed module source with function definitions indexed by (name, first line)"""
+
+    cache: ClassVar[OrderedDict[str, "ModuleIndex"]] = OrderedDict()
+    """Indexes of recently used modules by module name (least recently used are evicted)"""
+    cache_size: ClassVar[int] = 16
+    """Maximum number of cached modules (decorated functions are usually patched during import of module)"""
+
+    def __init__(self, source: str, stamp: tuple[int, int] | None = None) -> None:
+        self.source = source
+        self.stamp = stamp
+
+    @classmethod
+    def get(cls, obj: Callable) -> "ModuleIndex":
+        """Get index of module containing obj, module is parsed only once while file is not changed"""
+        stamp = _stamp(obj.__code__.co_filename)
+        index = cls.cache.get(obj.__module__)
+        if index is not None and stamp is not None and index.stamp == stamp:
+            cls.cache.move_to_end(obj.__module__)
+            return index
+        source = getsource(obj)
+        if index is None or index.source != source:
+            index = cls.cache[obj.__module__] = cls(source)
+        cls.cache.move_to_end(obj.__module__)
+        while len(cls.cache) > cls.cache_size:
+            cls.cache.popitem(last=False)
+        index.stamp = stamp
+        return index
+
+    @cached_property
+    def source_hash(self):
+        return source_hash(self.source.encode())
+
+    @cached_property
+    def functions(self):
+        functions: dict[tuple[str, int], list[AnyFunctionDef]] = {}
+        for item in ast.walk(ast.parse(self.source)):
+            if isinstance(item, AnyFunctionDef) and item.end_lineno:
+                functions.setdefault((item.name, item.lineno), []).append(item)
+                if item.decorator_list and item.decorator_list[0].lineno != item.lineno:
+                    functions.setdefault(
+                        (item.name, item.decorator_list[0].lineno), []
+                    ).append(item)
+        return functions
+
+    def find(self, obj: Callable) -> AnyFunctionDef:
+        """Find definition of function, returned node is shared, so it should be copied before modification"""
+        found = self.functions.get((obj.__name__, obj.__code__.co_firstlineno), [])
+        assert len(found) < 2, (
+            f"Unable to resolve double definition of {obj.__name__} in {inspect.getfile(obj)}"
+        )
+        assert found, (
+            f"Unable to resolve definition of {obj.__name__} in {inspect.getfile(obj)}"
+        )
+        return found[0]
+
+
 def get_ast(obj: Callable):
     """Get ast.Module containing with only function from arguments in body, will add __recmd_ast__ attribute to allow multiple patches"""
     if hasattr(obj, "__recmd_ast__"):
         assert (
             isinstance(obj.__recmd_ast__, ast.Module)
             and len(obj.__recmd_ast__.body) == 1
-            and isinstance(obj.__recmd_ast__.body[0], ast.FunctionDef)
+            and isinstance(obj.__recmd_ast__.body[0], AnyFunctionDef)
         ), "Invalid value of __recmd_ast__"
         return obj.__recmd_ast__
-    tree = ast.parse(getsource(obj))
-    body = None
-    for item in ast.walk(tree):
-        if (
-            isinstance(item, AnyFunctionDef)
-            and item.name == obj.__name__
-            and item.end_lineno
-            and (
-                (
-                    item.decorator_list
-                    and item.decorator_list[0].lineno == obj.__code__.co_firstlineno
-                )
-                or item.lineno == obj.__code__.co_firstlineno
-            )
-        ):
-            assert (
-                body is None
-            ), f"Unable to resolve double definition of {obj.__name__} in {inspect.getfile(obj)}"
-            body = item
-    assert (
-        body is not None
-    ), f"Unable to resolve definition of {obj.__name__} in {inspect.getfile(obj)}"
-    tree.body = [body]
-    obj.__recmd_ast__ = tree
+    body = deepcopy(ModuleIndex.get(obj).find(obj))
+    obj.__recmd_ast__ = ast.Module(body=[body], type_ignores=[])
     return obj.__recmd_ast__
 
 
@@ -107,20 +160,149 @@ def patch_function(
         Doc("Ast of this function will be passed to patcher and then updated in place"),
     ],
     patcher: Patcher,
+    *patchers: Patcher,
+    lazy: Annotated[
+        bool, Doc("Defer patching until first call of function (see `lazy_patch`)")
+    ] = False,
 ):
-    """Update __code__ of function inplace. Multiple patches can be applied using this function"""
+    """
+    Update __code__ of function inplace. Multiple patches can be applied using this function
+
+    All passed (and queued by `queue_patch`) patchers are applied to ast before single compilation
+    """
+
+    if lazy:
+        lazy_patch(function, patcher, *patchers)
+        return
+    with _lazy_lock:
+        queue_patch(patcher, *patchers)(function)
+        _flush_queue(function)
 
+
+def _flush_queue(function: Callable):
+    # trampoline keeps name and position of original code, so it is not restored
+    # (calls from other threads should wait for patched code instead of running original)
+    lazy = _is_trampoline(function.__code__)
+    pending: tuple[Patcher, ...] = function.__recmd_queue__  # type: ignore
+    del function.__recmd_queue__  # type: ignore
+    _patch_function(function, pending)
+    if lazy:
+        del function.__signature__  # type: ignore
+
+
+def _patch_function(function: Callable, pending: tuple[Patcher, ...]):
+    applied = getattr(function, "__recmd_patchers__", ())
+    cache = CodeCache.get()
+    if cache is not None and not hasattr(function, "__recmd_ast__"):
+        code = cache.load(
+            function, ModuleIndex.get(function).source_hash, (*applied, *pending)
+        )
+        if code is not None:
+            function.__code__ = code
+            function.__recmd_patchers__ = (*applied, *pending)
+            return
+
+    # previous patches were loaded from cache, so they should be applied to fresh ast
+    if not hasattr(function, "__recmd_ast__"):
+        pending = (*applied, *pending)
+        applied = ()
     module = get_ast(function)
     assert isinstance(module.body[0], AnyFunctionDef)
-    patcher(module.body[0])
+    for item in pending:
+        item(module.body[0])
     apply_ast(function, module)
+    function.__recmd_patchers__ = (*applied, *pending)
+    if cache is not None:
+        cache.store(
+            function,
+            ModuleIndex.get(function).source_hash,
+            function.__recmd_patchers__,
+            function.__code__,
+        )
+
 
+_LAZY_TARGET = "__recmd_lazy_target__"
+"""Placeholder constant of trampoline, replaced by weak reference to patched function (code objects are not tracked by gc)"""
+_lazy_lock = threading.RLock()
 
-def apply_patch(patcher: Patcher):
+
+def _trampoline(*args, **kwargs):
+    return __recmd_lazy__("__recmd_lazy_target__", args, kwargs)  # type: ignore # noqa: F821
+
+
+def _lazy_call(reference: weakref.ref[Callable], args: tuple, kwargs: dict):
+    # called function is kept alive by caller
+    function = reference()
+    assert function is not None
+    with _lazy_lock:
+        if _is_trampoline(function.__code__):
+            queue = function.__recmd_queue__
+            try:
+                _flush_queue(function)
+            except BaseException:
+                # keep trampoline, so error is raised on every call
+                with suppress(AttributeError):
+                    del function.__recmd_ast__
+                function.__recmd_queue__ = queue
+                raise
+    return function(*args, **kwargs)
+
+
+def _is_trampoline(code: types.CodeType):
+    return (
+        code.co_code == _trampoline.__code__.co_code
+        and code.co_names == _trampoline.__code__.co_names
+    )
+
+
+def lazy_patch(function: Callable, patcher: Patcher, *patchers: Patcher):
+    """
+    Queue patchers and install trampoline that patches function on first call (thread-safe)
+
+    Functions with closures can't use trampoline, so they are patched immediately
+    """
+    with _lazy_lock:
+        queue_patch(patcher, *patchers)(function)
+        code = function.__code__
+        if _is_trampoline(code):
+            return
+        if code.co_freevars:
+            _flush_queue(function)
+            return
+
+        # keep introspection (inspect.signature, inspect.iscoroutinefunction) of original function
+        function.__signature__ = inspect.signature(function)  # type: ignore
+        if inspect.iscoroutinefunction(function):
+            inspect.markcoroutinefunction(function)
+        function.__globals__.setdefault("__recmd_lazy__", _lazy_call)
+        function.__code__ = _trampoline.__code__.replace(
+            co_name=code.co_name,
+            co_qualname=code.co_qualname,
+            co_filename=code.co_filename,
+            co_firstlineno=code.co_firstlineno,
+            co_consts=tuple(
+                weakref.ref(function) if x == _LAZY_TARGET else x
+                for x in _trampoline.__code__.co_consts
+            ),
+        )
+
+
+def apply_patch(patcher: Patcher, *patchers: Patcher, lazy: bool = False):
     """Update __code__ of function inplace."""
 
     def wrapper[F: Callable](function: F) -> F:
-        patch_function(function, patcher)
+        patch_function(function, patcher, *patchers, lazy=lazy)
+        return function
+
+    return wrapper
+
+
+def queue_patch(patcher: Patcher, *patchers: Patcher):
+    """Queue patchers without compilation, they will be applied by next `patch_function`/`apply_patch`"""
+
+    def wrapper[F: Callable](function: F) -> F:
+        queue = getattr(function, "__recmd_queue__", ())
+        function.__recmd_queue__ = (*queue, patcher, *patchers)  # type: ignore
         return function
 
     return wrapper
@@ -0,0 +1,156 @@
+from contextlib import suppress
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator
+
+from .stream import CHUNK_SIZE, IOStream
+
+if TYPE_CHECKING:
+    from .command import Command
+
+__all__ = ["RecordSplitter", "Records"]
+
+
+class RecordSplitter:
+    """Incrementally split chunks by separator, only incomplete record is kept between chunks"""
+
+    def __init__(self, sep: bytes = b"\n") -> None:
+        assert sep, "Separator should not be empty"
+        self.sep = sep
+        self._buffer = bytearray()
+        self._scanned = 0
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Add chunk, returns records completed by it"""
+        buffer = self._buffer
+        buffer += data
+        records = []
+        start = 0
+        # separator may be split between chunks
+        position = max(0, self._scanned - len(self.sep) + 1)
+        while (index := buffer.find(self.sep, position)) != -1:
+            records.append(bytes(buffer[start:index]))
+            start = position = index + len(self.sep)
+        del buffer[:start]
+        self._scanned = len(buffer)
+        return records
+
+    def feed_eof(self) -> bytes | None:
+        """Returns last record if output does not end with separator"""
+        if not self._buffer:
+            return None
+        record = bytes(self._buffer)
+        self._buffer.clear()
+        self._scanned = 0
+        return record
+
+
+class Records[T: str | bytes]:
+    """
+    Iterate over records of stdout while command is running (for and async for are supported)
+
+    Process is terminated if iteration stops before end of output, use `with`/`async with` for deterministic cleanup
+    """
+
+    def __init__(
+        self,
+        command: "Command",
+        sep: bytes = b"\n",
+        convert: Callable[[bytes], T] | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        assert command.stdout is None, "stdout is already redirected"
+        command.stdout = IOStream()
+        command.stdout.reports_activity = True
+        self.command = command
+        self.sep = sep
+        self.convert = convert
+        self.chunk_size = chunk_size
+        self._iterator: Iterator[T] | None = None
+        self._async_iterator: AsyncIterator[T] | None = None
+
+    def _records(self, records: list[bytes]) -> list[T]:
+        if self.convert is None:
+            return records  # type: ignore
+        return [self.convert(record) for record in records]
+
+    def _terminate(self):
+        process = self.command.running._process
+        if hasattr(process, "poll"):
+            process.poll()
+        if process.returncode is None:
+            with suppress(ProcessLookupError):
+                process.terminate()
+
+    def _iterate(self) -> Iterator[T]:
+        splitter = RecordSplitter(self.sep)
+        with self.command:
+            io = self.command.stdout.sync_io
+            read = getattr(io, "read1", io.read)
+            try:
+                while chunk := read(self.chunk_size):
+                    self.command.stdout.touch()
+                    yield from self._records(splitter.feed(chunk))
+                if (record := splitter.feed_eof()) is not None:
+                    yield from self._records([record])
+            except BaseException:
+                self._terminate()
+                raise
+            finally:
+                io.close()
+
+    async def _iterate_async(self) -> AsyncIterator[T]:
+        import anyio
+
+        splitter = RecordSplitter(self.sep)
+        async with self.command:
+            stream = self.command.stdout.async_read
+            try:
+                while True:
+                    try:
+                        chunk = await stream.receive(self.chunk_size)
+                    except anyio.EndOfStream:
+                        break
+                    self.command.stdout.touch()
+                    for record in self._records(splitter.feed(chunk)):
+                        yield record
+                if (record := splitter.feed_eof()) is not None:
+                    for record in self._records([record]):
+                        yield record
+            except GeneratorExit:
+                # leave executor normally, task group would wrap GeneratorExit into exception group
+                self._terminate()
+            except BaseException:
+                self._terminate()
+                raise
+            finally:
+                await stream.aclose()
+
+    def __iter__(self) -> Iterator[T]:
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        if self._async_iterator is None:
+            self._async_iterator = self._iterate_async()
+        return self._async_iterator
+
+    def close(self):
+        """Stop iteration, terminate process if it is still running and wait for it"""
+        if self._iterator is not None:
+            self._iterator.close()  # type: ignore
+
+    async def aclose(self):
+        if self._async_iterator is not None:
+            await self._async_iterator.aclose()  # type: ignore
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
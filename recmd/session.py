@@ -0,0 +1,531 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import suppress
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Literal
+
+from .exceptions import SessionError
+from .records import RecordSplitter
+from .stream import CHUNK_SIZE, DevNull, IOStream, Stream
+
+if TYPE_CHECKING:
+    import anyio
+    import anyio.abc
+
+    from .command import Command
+
+__all__ = [
+    "Delimited",
+    "Framing",
+    "FramingName",
+    "LengthPrefixed",
+    "Sentinel",
+    "Session",
+    "SessionPool",
+]
+
+FramingName = Literal["line", "nul", "length"]
+DEFAULT_GRACE = 1.0
+"""Seconds to wait for process exit after stdin is closed (then it is terminated)"""
+DIRECT_WRITE = 1 << 12
+"""Larger requests are written concurrently with reading of response (process may respond before whole request is read)"""
+
+
+class Framing(ABC):
+    """Encodes requests and splits output into responses, `decoder()` creates state for single process"""
+
+    @abstractmethod
+    def encode(self, request: bytes) -> bytes: ...
+
+    @abstractmethod
+    def decoder(self) -> Any:
+        """Object with `feed(data) -> list[bytes]` returning completed responses"""
+
+    @staticmethod
+    def get(framing: "Framing | FramingName") -> "Framing":
+        if isinstance(framing, Framing):
+            return framing
+        if framing == "line":
+            return Delimited(b"\n")
+        if framing == "nul":
+            return Delimited(b"\0")
+        if framing == "length":
+            return LengthPrefixed()
+        raise ValueError(f"Unknown framing {framing!r}")
+
+
+class Delimited(Framing):
+    """Requests and responses end with separator (line-delimited, NUL-delimited)"""
+
+    def __init__(self, sep: bytes = b"\n") -> None:
+        assert sep, "Separator should not be empty"
+        self.sep = sep
+
+    def encode(self, request: bytes) -> bytes:
+        if self.sep in request:
+            raise ValueError(f"Request contains separator {self.sep!r}")
+        return request + self.sep
+
+    def decoder(self):
+        return RecordSplitter(self.sep)
+
+
+class Sentinel(Framing):
+    """
+    Response ends with `sentinel` (not included into response), `suffix` is appended to every request
+
+    For example, shell reading commands: `Sentinel(b"__end__\\n", suffix=b"\\necho __end__\\n")`
+    """
+
+    def __init__(self, sentinel: bytes, suffix: bytes = b"\n") -> None:
+        assert sentinel, "Sentinel should not be empty"
+        self.sentinel = sentinel
+        self.suffix = suffix
+
+    def encode(self, request: bytes) -> bytes:
+        return request + self.suffix
+
+    def decoder(self):
+        return RecordSplitter(self.sentinel)
+
+
+class _LengthDecoder:
+    def __init__(self, size: int, byteorder: Literal["little", "big"]) -> None:
+        self.size = size
+        self.byteorder: Literal["little", "big"] = byteorder
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        buffer = self._buffer
+        buffer += data
+        responses = []
+        start = 0
+        while len(buffer) - start >= self.size:
+            length = int.from_bytes(buffer[start : start + self.size], self.byteorder)
+            end = start + self.size + length
+            if len(buffer) < end:
+                break
+            responses.append(bytes(buffer[start + self.size : end]))
+            start = end
+        del buffer[:start]
+        return responses
+
+
+class LengthPrefixed(Framing):
+    """Requests and responses are prefixed with their length (unsigned integer of `size` bytes)"""
+
+    def __init__(
+        self, size: int = 4, byteorder: Literal["little", "big"] = "big"
+    ) -> None:
+        self.size = size
+        self.byteorder: Literal["little", "big"] = byteorder
+
+    def encode(self, request: bytes) -> bytes:
+        return len(request).to_bytes(self.size, self.byteorder) + request
+
+    def decoder(self):
+        return _LengthDecoder(self.size, self.byteorder)
+
+
+def _clone(command: "Command") -> "Command":
+    from .command import Command
+
+    clone = Command(
+        list(command.cmd),
+        stderr=command.stderr,
+        inherit_env=command.inherit_env,
+        env=dict(command.environment),
+        options=dict(command.options),
+    )
+    clone.cwd = command.cwd
+    return clone
+
+
+def _stop_process(process: Any, grace: float):
+    """Wait for exit after stdin is closed, terminate (and kill) process if it does not exit in `grace` seconds"""
+    for stop in (process.terminate, process.kill):
+        deadline = time.monotonic() + grace
+        while process.poll() is None:
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.005)
+        else:
+            return
+        try:
+            stop()
+        except ProcessLookupError:
+            return
+
+
+class _Writer(threading.Thread):
+    """Writes request into stdin while response is read, so pipes are not filled from both sides"""
+
+    def __init__(self, stdin: Any, request: bytes) -> None:
+        super().__init__(daemon=True)
+        self.stdin = stdin
+        self.request = request
+        self.error: BaseException | None = None
+
+    def run(self):
+        try:
+            self.stdin.write(self.request)
+            self.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.error = e
+
+
+async def _aclose(stream: Any):
+    with suppress(OSError):
+        await stream.aclose()
+
+
+class Session:
+    """
+    Long-lived process answering requests written into stdin with responses in stdout (`request`/`request_async`)
+
+    Process is started on first request (copy of command, so command can be reused), if it exits or closes
+    its streams, request raises `SessionError` (or is retried `retries` times) and new process is started
+    on next request. Requests of one session are serialized
+
+    Process should write exactly one response per request: if extra responses are received together with response,
+    request raises `SessionError` and process is restarted (responses received after request is complete are
+    returned to next requests, protocol can't detect them)
+    """
+
+    def __init__(
+        self,
+        command: "Command",
+        framing: Framing | FramingName = "line",
+        retries: int = 0,
+        grace: float = DEFAULT_GRACE,
+    ) -> None:
+        assert command.stdin is None, "stdin is already redirected"
+        assert command.stdout is None, "stdout is already redirected"
+        # every process of session is started from copy of command, stream instances can't be shared between them
+        assert not isinstance(command.stderr, Stream) or isinstance(
+            command.stderr, DevNull
+        ), "stderr of session should be None, descriptor, file or path"
+        self.template = command
+        self.framing = Framing.get(framing)
+        self.retries = retries
+        self.grace = grace
+        self.command: "Command | None" = None
+        """Running process"""
+        self.starts = 0
+        """Number of started processes (restarts after crashes included)"""
+        self._decoder: Any = None
+        self._responses: deque[bytes] = deque()
+        self._lock = threading.Lock()
+        self._async_lock: "anyio.Lock | None" = None
+        self._task_group: "anyio.abc.TaskGroup | None" = None
+        self._own_task_group = False
+        self._stop_event: "anyio.Event | None" = None
+
+    def _new_command(self) -> "Command":
+        self.starts += 1
+        command = _clone(self.template)
+        command.stdin = IOStream()
+        command.stdout = IOStream()
+        command.stdout.reports_activity = True
+        self._decoder = self.framing.decoder()
+        self._responses.clear()
+        return command
+
+    def _error(self, command: "Command", cause: BaseException) -> SessionError:
+        status = command.complete.status if command.did_complete() else None
+        return SessionError(command, status, f"{command.cmd} stopped: {cause!r}")
+
+    def _unexpected(self, command: "Command") -> SessionError:
+        count = len(self._responses)
+        self._responses.clear()
+        return SessionError(
+            command, None, f"{command.cmd} sent {count} unexpected response(s)"
+        )
+
+    # sync
+
+    def _start(self):
+        command = self._new_command()
+        command.__enter__()
+        self.command = command
+
+    def _stop(self):
+        command, self.command = self.command, None
+        if command is None:
+            return
+        try:
+            with suppress(OSError):
+                command.stdin.sync_io.close()
+            _stop_process(command.running._process, self.grace)
+        finally:
+            command.__exit__(None, None, None)
+            command.stdout.sync_io.close()
+
+    def _exchange(self, command: "Command", request: bytes) -> bytes:
+        stdin = command.stdin.sync_io
+        writer = None
+        if len(request) <= DIRECT_WRITE:
+            stdin.write(request)
+            stdin.flush()
+        else:
+            writer = _Writer(stdin, request)
+            writer.start()
+        stdout = command.stdout.sync_io
+        read = getattr(stdout, "read1", stdout.read)
+        try:
+            while not self._responses:
+                chunk = read(CHUNK_SIZE)
+                if not chunk:
+                    raise EOFError("End of output")
+                command.stdout.touch()
+                self._responses.extend(self._decoder.feed(chunk))
+        except BaseException:
+            if writer is not None and writer.is_alive():
+                # writer is blocked until process exits (stdin can't be closed while it is written)
+                with suppress(ProcessLookupError):
+                    command.running._process.kill()
+                writer.join()
+            raise
+        if writer is not None:
+            writer.join()
+            if writer.error is not None:
+                raise writer.error
+        return self._responses.popleft()
+
+    def request(self, data: bytes | str) -> bytes:
+        """Send request and wait for response"""
+        request = self.framing.encode(data.encode() if isinstance(data, str) else data)
+        with self._lock:
+            attempt = 0
+            while True:
+                if self.command is None:
+                    self._start()
+                command = self.command
+                assert command is not None
+                try:
+                    response = self._exchange(command, request)
+                except (OSError, EOFError, ValueError) as e:
+                    # ValueError: io of closed stream
+                    self._stop()
+                    if attempt >= self.retries:
+                        raise self._error(command, e) from e
+                    attempt += 1
+                    continue
+                if self._responses:
+                    # responses are out of sync with requests
+                    error = self._unexpected(command)
+                    self._stop()
+                    raise error
+                return response
+
+    def close(self):
+        """Close stdin and wait for process exit (it is terminated after `grace` seconds)"""
+        with self._lock:
+            self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # async
+
+    async def _run(
+        self,
+        command: "Command",
+        stop: "anyio.Event",
+        *,
+        task_status: "anyio.abc.TaskStatus",
+    ):
+        import anyio
+
+        # executor context is entered and exited in one task
+        async with command:
+            task_status.started()
+            await stop.wait()
+            with anyio.CancelScope(shield=True):
+                await _aclose(command.stdin.async_write)
+                process = command.running._process
+                for stop_process in (process.terminate, process.kill):
+                    with anyio.move_on_after(self.grace):
+                        await process.wait()
+                        break
+                    try:
+                        stop_process()
+                    except ProcessLookupError:
+                        break
+        await _aclose(command.stdout.async_read)
+
+    async def _start_async(self):
+        import anyio
+
+        assert self._task_group is not None, "use `async with session`"
+        command = self._new_command()
+        self._stop_event = anyio.Event()
+        await self._task_group.start(self._run, command, self._stop_event)
+        self.command = command
+
+    def _stop_async(self):
+        self.command = None
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._stop_event = None
+
+    async def _send(
+        self, command: "Command", request: bytes, done: "anyio.Event", errors: list
+    ):
+        try:
+            await command.stdin.async_write.send(request)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    async def _exchange_async(self, command: "Command", request: bytes) -> bytes:
+        import anyio
+
+        done = None
+        errors: list[BaseException] = []
+        if len(request) <= DIRECT_WRITE:
+            await command.stdin.async_write.send(request)
+        else:
+            # task is stopped by closed stdin if response is not received
+            assert self._task_group is not None
+            done = anyio.Event()
+            self._task_group.start_soon(self._send, command, request, done, errors)
+        stream = command.stdout.async_read
+        while not self._responses:
+            chunk = await stream.receive(CHUNK_SIZE)
+            command.stdout.touch()
+            self._responses.extend(self._decoder.feed(chunk))
+        if done is not None:
+            await done.wait()
+            if errors:
+                raise errors[0]
+        return self._responses.popleft()
+
+    async def request_async(self, data: bytes | str) -> bytes:
+        import anyio
+
+        request = self.framing.encode(data.encode() if isinstance(data, str) else data)
+        if self._async_lock is None:
+            self._async_lock = anyio.Lock()
+        async with self._async_lock:
+            attempt = 0
+            while True:
+                if self.command is None:
+                    await self._start_async()
+                command = self.command
+                assert command is not None
+                try:
+                    response = await self._exchange_async(command, request)
+                except (
+                    anyio.EndOfStream,
+                    anyio.BrokenResourceError,
+                    anyio.ClosedResourceError,
+                    OSError,
+                ) as e:
+                    self._stop_async()
+                    if attempt >= self.retries:
+                        raise self._error(command, e) from e
+                    attempt += 1
+                    continue
+                if self._responses:
+                    self._stop_async()
+                    raise self._unexpected(command)
+                return response
+
+    async def aclose(self):
+        self._stop_async()
+
+    async def __aenter__(self):
+        import anyio
+
+        if self._task_group is None:
+            self._task_group = anyio.create_task_group()
+            self._own_task_group = True
+            await self._task_group.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+        if self._own_task_group:
+            task_group, self._task_group = self._task_group, None
+            self._own_task_group = False
+            assert task_group is not None
+            await task_group.__aexit__(*args)
+
+
+class SessionPool:
+    """
+    Pool of `size` sessions of same command, request is sent to idle session (processes are started on demand)
+
+    Sync requests can be sent from several threads, async requests require `async with pool`
+    """
+
+    def __init__(
+        self,
+        command: "Command",
+        size: int,
+        framing: Framing | FramingName = "line",
+        retries: int = 0,
+        grace: float = DEFAULT_GRACE,
+    ) -> None:
+        assert size > 0, "size should be positive"
+        self.sessions = [Session(command, framing, retries, grace) for _ in range(size)]
+        self._idle: queue.SimpleQueue[Session] = queue.SimpleQueue()
+        for session in self.sessions:
+            self._idle.put(session)
+        self._async_idle: Any = None
+
+    def request(self, data: bytes | str) -> bytes:
+        session = self._idle.get()
+        try:
+            return session.request(data)
+        finally:
+            self._idle.put(session)
+
+    async def request_async(self, data: bytes | str) -> bytes:
+        assert self._async_idle is not None, "use `async with pool`"
+        send, receive = self._async_idle
+        session = await receive.receive()
+        try:
+            return await session.request_async(data)
+        finally:
+            send.send_nowait(session)
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def __aenter__(self):
+        import anyio
+
+        self._task_group = anyio.create_task_group()
+        await self._task_group.__aenter__()
+        self._async_idle = anyio.create_memory_object_stream[Session](
+            len(self.sessions)
+        )
+        for session in self.sessions:
+            session._task_group = self._task_group
+            self._async_idle[0].send_nowait(session)
+        return self
+
+    async def __aexit__(self, *args):
+        for session in self.sessions:
+            await session.aclose()
+            session._task_group = None
+        send, receive = self._async_idle
+        send.close()
+        receive.close()
+        self._async_idle = None
+        await self._task_group.__aexit__(*args)
@@ -1,20 +1,49 @@
+from functools import partial
 from typing import Callable, Never, overload
 from .command import Command
+from .compiler import COMPILED
 from .patcher import patch_function
 from .shell_patch import patch_shell_arguments
 from .template import Template, template_to_command
 
+LAZY = False
+"""Default for `sh(..., lazy=...)`: patch decorated functions on first call instead of import"""
+
+
+def set_lazy(lazy: bool = True):
+    """Set default for `sh(..., lazy=...)` (`recmd.shell` is shadowed by `shell` function in `recmd`)"""
+    global LAZY
+    LAZY = lazy
+
 
 @overload
-def sh[C: Callable](cmd: C) -> C: ...
+def sh[C: Callable](
+    cmd: C, *, lazy: bool | None = None, compiled: bool = False
+) -> C: ...
 @overload
 def sh(cmd: str | list[str] | Template) -> Command[None, None, None]: ...
-def sh(cmd: str | list[str] | Template | Callable):
+@overload
+def sh[C: Callable](
+    *, lazy: bool | None = None, compiled: bool = False
+) -> Callable[[C], C]: ...
+def sh(
+    cmd: str | list[str] | Template | Callable | None = None,
+    *,
+    lazy: bool | None = None,
+    compiled: bool = False,
+):
+    if cmd is None:
+        return partial(sh, lazy=lazy, compiled=compiled)
     if Template is not Never and isinstance(cmd, Template):
         cmd = list(template_to_command(cmd))
     if isinstance(cmd, str | list):
         return Command(cmd)
-    patch_function(cmd, patcher=patch_shell_arguments)
+    if compiled or getattr(cmd, "__globals__", {}).get(COMPILED):
+        # already transformed by `python -m recmd compile` or import hook
+        return cmd
+    patch_function(
+        cmd, patcher=patch_shell_arguments, lazy=LAZY if lazy is None else lazy
+    )
     return cmd
 
 
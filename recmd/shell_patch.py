@@ -114,8 +114,8 @@ def merge_group(group: list[ast.expr]):
         should_format = fmt.startswith(":")
         if conversion > 0 or should_format:
             fmt = fmt.removeprefix(":")
-            # (f"{x!{conversion}:{fmt}}" for x in {value})
-            value = ast.GeneratorExp(
+            # [f"{x!{conversion}:{fmt}}" for x in {value}] (list comprehensions are inlined, unlike generators)
+            value = ast.ListComp(
                 elt=ast.JoinedStr(
                     values=[
                         ast.FormattedValue(
@@ -202,7 +202,7 @@ def string_to_list(node: ast.JoinedStr | ast.Constant):
 
 
 def patch_shell_arguments[**P](
-    function: AnyFunctionDef,
+    function: AnyFunctionDef | ast.Module,
     names: list[str] = NAMES,
     convert: Callable[
         Concatenate[ast.JoinedStr | ast.Constant, P],
@@ -227,8 +227,9 @@ def patch_shell_arguments[**P](
     10. spaces and quotes can be escaped using \ ("'a\' b' c d\ e \\" -> ["a' b", "c", "d e", "\"])
 
     Examples:
-    * `shell(f'echo --arg={1}postfix')` to `shell([f'echo', f'--arg={1}postfix'])`
-    * `shell(f'echo {['a', 'b']:*}')` to `shell([f'echo', *['a', 'b']])`
+    * `shell(f'echo --arg={1}postfix')` to `shell(['echo', f'--arg={1}postfix'])`
+    * `shell(f'echo {['a', 'b']:*}')` to `shell(['echo', *['a', 'b']])`
+    * `shell(f'echo {[1]:*!s}')` to `shell(['echo', *[f'{x!s}' for x in [1]]])`
     """
 
     for node in ast.walk(function):
@@ -240,6 +241,7 @@ def patch_shell_arguments[**P](
                 # __object.sh(...)__
                 or (isinstance(node.func, ast.Attribute) and node.func.attr in names)
             )
+            and node.args
             and (
                 # ...(__f""__)
                 isinstance(node.args[0], ast.JoinedStr)
@@ -1,9 +1,24 @@
+from collections.abc import Buffer
+from codecs import getincrementaldecoder
+from contextlib import suppress
+import mmap
+import os
 from pathlib import PurePath
+import stat
 import subprocess
+import sys
+import tempfile
+import time
 from typing import (
     IO,
     TYPE_CHECKING,
     Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence,
     Literal,
     Protocol,
     Type,
@@ -12,11 +27,17 @@ from typing import (
     overload,
 )
 
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
 
 if TYPE_CHECKING:
     from anyio.abc import AnyByteReceiveStream, AnyByteSendStream
 
 
+CHUNK_SIZE = 1 << 16
 StreamName = Literal["stdin", "stdout", "stderr"]
 SyncIO = tuple[IO[bytes] | None, StreamName]
 AsyncIO = (
@@ -29,7 +50,37 @@ class StreamError(RuntimeError):
     pass
 
 
+async def to_thread[T](fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run blocking function in worker thread, anyio is used if it is installed (cancellation waits for thread),
+    otherwise asyncio (`AsyncioExecutor` without anyio)
+    """
+    try:
+        import anyio.to_thread
+    except ImportError:
+        import asyncio
+
+        return await asyncio.to_thread(fn, *args)
+    return await anyio.to_thread.run_sync(fn, *args)
+
+
 class Stream:
+    last_activity: float | None = None
+    """Monotonic time of last received output (updated by streams that read output in current process)"""
+
+    on_first_byte: Callable[[float], None] | None = None
+    """Called by `touch` with time of first output (set by executors with hooks)"""
+
+    reports_activity = False
+    """Stream calls `touch` when output is received, so it can be used with idle timeout"""
+
+    def touch(self):
+        """Report activity to watchdog (see `Command.with_timeout`)"""
+        now = time.monotonic()
+        if self.last_activity is None and self.on_first_byte is not None:
+            self.on_first_byte(now)
+        self.last_activity = now
+
     def setup(self, stream: StreamName) -> int | IO | None:
         """Will be called as Popen arg: (Popen(..., stdin=Stream.setup("stdin")))"""
 
@@ -49,6 +100,9 @@ class Stream:
     async def close_async(self):
         """Will be called after process end"""
 
+    def process(self):
+        """Process something while process is running (executed in separate thread by sync executor)"""
+
     async def process_async(self):
         """Process something while process is running"""
 
@@ -81,8 +135,26 @@ class DescriptorReference(Stream):
         raise NotImplementedError()
 
 
+def set_pipe_size(descriptor: int, size: int | None):
+    """Change pipe capacity (F_SETPIPE_SZ, linux only), capacity is a hint, so errors are ignored"""
+    if size is None or fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    with suppress(OSError):
+        fcntl.fcntl(descriptor, fcntl.F_SETPIPE_SZ, size)
+
+
 class Pipe(DescriptorReference):
-    """Ensures that producer process starts before consumer"""
+    """
+    Ensures that producer process starts before consumer
+
+    Output of producer is passed to consumer by kernel (consumer receives descriptor), `size` changes pipe capacity
+    """
+
+    def __init__(self, size: int | None = None):
+        super().__init__()
+        self.size = size
+        self._read: int | None = None
+        self._write: int | None = None
 
     def setup(self, stream: StreamName) -> int:
         if stream == "stdin":
@@ -96,34 +168,49 @@ class Pipe(DescriptorReference):
                 )
             return subprocess.PIPE
 
+    def init(self, io: SyncIO):
+        super().init(io)
+        if io[1] != "stdin":
+            assert self.descriptor is not None
+            set_pipe_size(self.descriptor, self.size)
+
     async def setup_async(self, stream: StreamName):
-        return subprocess.PIPE
+        if self._read is None and self._write is None:
+            self._read, self._write = os.pipe()
+            set_pipe_size(self._write, self.size)
+        descriptor = self._read if stream == "stdin" else self._write
+        if descriptor is None:
+            raise StreamError(f"Pipe end is already passed into {stream}")
+        return descriptor
 
     async def init_async(self, io: AsyncIO):
-        if io[1] == "stdin":
-            assert io[0] is not None
-            self.async_write = io[0]
-            return
-        assert io[0] is not None
-        self.async_read = io[0]
+        # process has own copy of descriptor, parent copy should be closed, so consumer receives EOF
+        self._close("stdin" if io[1] == "stdin" else "stdout")
 
-    async def process_async(self):
-        if (
-            hasattr(self, "_running")
-            or not hasattr(self, "async_write")
-            or not hasattr(self, "async_read")
-        ):
-            return
-        self._running = True
-        async with self.async_read, self.async_write:
-            while True:
-                import anyio
+    def writer(self) -> int:
+        """Create pipe written by current process (used by `Tee`), returns write end owned by caller"""
+        if self.descriptor is not None or self._read is not None:
+            raise StreamError("Pipe already has producer")
+        self._read, write = os.pipe()
+        set_pipe_size(write, self.size)
+        self.descriptor = self._read
+        return write
 
-                try:
-                    value = await self.async_read.receive()
-                except anyio.EndOfStream:
-                    break
-                await self.async_write.send(value)
+    def close(self):
+        self._close("stdin")
+
+    def _close(self, stream: StreamName):
+        if stream == "stdin" and self._read is not None:
+            os.close(self._read)
+            self._read = None
+        elif stream != "stdin" and self._write is not None:
+            os.close(self._write)
+            self._write = None
+
+    async def close_async(self):
+        # descriptors are left open only if process was not started
+        self._close("stdin")
+        self._close("stdout")
 
 
 class DevNull(DescriptorReference):
@@ -168,49 +255,507 @@ class IOStream(DescriptorReference):
 
 
 class Capture[T: str | bytes](IOStream):
+    """Collect output into memory, Capture[str] decodes output incrementally while it is received"""
+
+    reports_activity = True
     _output: Type[T] = bytes  # type: ignore
-    data: bytes
+    text: str
+    """Decoded output of Capture[str]"""
+
+    def __init__(self, encoding: str = "utf-8", errors: str = "strict"):
+        super().__init__()
+        self.encoding = encoding
+        self.errors = errors
+        self._chunks: list = []
+        self._decoder = None
+        if self._output is str:
+            self._decoder = getincrementaldecoder(encoding)(errors)
+
+    @property
+    def data(self) -> bytes:
+        """Raw output (encoded back for Capture[str])"""
+        if self._decoder is not None:
+            return self.text.encode(self.encoding, self.errors)
+        return self._data
 
     @overload
     def get(self: "Capture[str]") -> str: ...
     @overload
     def get(self) -> bytes: ...
     def get(self):
-        if self._output is str:
-            return self.data.decode()
-        return self.data
+        if self._decoder is not None:
+            return self.text
+        return self._data
 
     def __class_getitem__(cls, item: type[str]):
         return type(f"{cls.__name__}[{item.__name__}]", (cls,), {"_output": item})
 
+    def feed_data(self, data: bytes):
+        """Add received chunk"""
+        self.touch()
+        if self._decoder is not None:
+            self._chunks.append(self._decoder.decode(data))
+        else:
+            self._chunks.append(data)
+
+    def feed_eof(self):
+        """Join received chunks, called once after stream end"""
+        if self._decoder is not None:
+            self._chunks.append(self._decoder.decode(b"", final=True))
+            self.text = "".join(self._chunks)
+        else:
+            self._data = b"".join(self._chunks)
+        self._chunks.clear()
+
+    def process(self):
+        """Drain stream while process is running, so process is not blocked by full pipe"""
+        read = getattr(self.sync_io, "read1", self.sync_io.read)
+        while chunk := read(CHUNK_SIZE):
+            self.feed_data(chunk)
+
     def close(self):
         if hasattr(self, "sync_io"):
-            self.data = self.sync_io.read()
+            self.feed_data(self.sync_io.read())
+            self.sync_io.close()
+            self.feed_eof()
+
+    async def process_async(self):
+        import anyio
+
+        while True:
+            try:
+                self.feed_data(await self.async_read.receive(CHUNK_SIZE))
+            except anyio.EndOfStream:
+                break
 
     async def close_async(self):
         if not hasattr(self, "async_read"):
             return
-        self.data = await self.async_read.receive()
+        # process_async may be not called (for example if stream is used outside executor)
+        await self.process_async()
+        await self.async_read.aclose()
+        self.feed_eof()
+
+
+class TailCapture[T: str | bytes](Capture[T]):
+    """
+    Keep only last `max_bytes` of output (and first `head_bytes` if passed), memory usage does not depend on output size
+
+    Number of discarded bytes is available as `dropped` after process end. TailCapture[str] decodes retained output,
+    characters split by discarded part are dropped
+    """
+
+    head: bytes
+    tail: bytes
+
+    def __init__(
+        self,
+        max_bytes: int,
+        head_bytes: int = 0,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ):
+        super().__init__(encoding, errors)
+        assert max_bytes > 0, "max_bytes should be positive"
+        self.max_bytes = max_bytes
+        self.head_bytes = head_bytes
+        self.dropped = 0
+        self._head = bytearray()
+        self._buffer = bytearray(max_bytes)
+        self._position = 0
+        self._size = 0
+
+    def feed_data(self, data: bytes):
+        self.touch()
+        view = memoryview(data)
+        if len(self._head) < self.head_bytes:
+            size = self.head_bytes - len(self._head)
+            self._head += view[:size]
+            view = view[size:]
+        self.dropped += max(0, self._size + len(view) - self.max_bytes)
+        view = view[-self.max_bytes :]
+        first = min(len(view), self.max_bytes - self._position)
+        self._buffer[self._position : self._position + first] = view[:first]
+        self._buffer[: len(view) - first] = view[first:]
+        self._position = (self._position + len(view)) % self.max_bytes
+        self._size = min(self.max_bytes, self._size + len(view))
+
+    def feed_eof(self):
+        if self._size < self.max_bytes:
+            self.tail = bytes(self._buffer[: self._size])
+        else:
+            self.tail = bytes(
+                self._buffer[self._position :] + self._buffer[: self._position]
+            )
+        self.head = bytes(self._head)
+        self._data = self.head + self.tail
+        self._buffer = bytearray()
+        if self._decoder is not None:
+            self.text = self._decode()
+
+    def _decode(self) -> str:
+        if not self.dropped:
+            return self._data.decode(self.encoding, self.errors)
+        assert self._decoder is not None
+        # incomplete character at the end of head stays in decoder
+        head = self._decoder.decode(self.head)
+        tail = self.tail[self._partial_prefix(self.tail) :]
+        return head + tail.decode(self.encoding, self.errors)
+
+    def _partial_prefix(self, data: bytes) -> int:
+        """Number of leading bytes that belong to character started in discarded output"""
+        for offset in range(min(4, len(data))):
+            with suppress(UnicodeDecodeError):
+                getincrementaldecoder(self.encoding)().decode(data[offset : offset + 8])
+                return offset
+        return 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+
+class SpillCapture[T: str | bytes](Capture[T]):
+    """
+    Collect output in memory up to `threshold` bytes, rest is written into temporary file
+
+    Result is available without copying as `view()` (file is memory-mapped), `get()` returns bytes copy
+    (SpillCapture[str] decodes output on `get()`)
+    """
+
+    mapped: mmap.mmap | None = None
+    """Mapped temporary file (None if output was not spilled)"""
+
+    def __init__(
+        self,
+        threshold: int = 1 << 24,
+        directory: str | None = None,
+        encoding: str = "utf-8",
+        errors: str = "strict",
+    ):
+        super().__init__(encoding, errors)
+        self.threshold = threshold
+        self.directory = directory
+        self.size = 0
+        self._buffer = bytearray()
+        self._file: IO[bytes] | None = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None or self.mapped is not None
+
+    def feed_data(self, data: bytes):
+        self.touch()
+        self.size += len(data)
+        if self._file is None and len(self._buffer) + len(data) <= self.threshold:
+            self._buffer += data
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory)
+            self._file.write(self._buffer)
+            self._buffer = bytearray()
+        self._file.write(data)
+
+    def feed_eof(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        # mapping stays valid after file is closed (and removed)
+        self.mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file.close()
+        self._file = None
+
+    def view(self) -> memoryview:
+        """Output without copying, should be released before `release()` call"""
+        if self.mapped is not None:
+            return memoryview(self.mapped)
+        return memoryview(self._buffer).toreadonly()
+
+    @property
+    def data(self) -> bytes:
+        with self.view() as view:
+            return view.tobytes()
+
+    @overload
+    def get(self: "SpillCapture[str]") -> str: ...
+    @overload
+    def get(self) -> bytes: ...
+    def get(self):
+        with self.view() as view:
+            if self._decoder is not None:
+                return str(view, self.encoding, self.errors)
+            return view.tobytes()
 
+    def release(self):
+        """Unmap temporary file"""
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        self._buffer = bytearray()
 
-class Send(IOStream):
-    """Write data and close"""
 
-    def __init__(self, data: bytes | str) -> None:
+type FeedSource = (
+    Iterable[bytes | str] | AsyncIterable[bytes | str] | IO[bytes] | IO[str]
+)
+
+
+class Feed(IOStream):
+    """
+    Write chunks into stdin while process is running and close it
+
+    Accepts iterables, generators, file objects and async iterables (async executor only),
+    next chunk is requested only after previous one is written, so pipe backpressure is respected.
+    Single str or bytes is written as one chunk
+    """
+
+    def __init__(self, source: FeedSource, encoding: str = "utf-8") -> None:
         super().__init__()
+        if isinstance(source, str | bytes | bytearray):
+            source = [source]
+        self.source = source
+        self.encoding = encoding
+
+    def _encode(self, chunk: bytes | str) -> bytes:
+        if isinstance(chunk, str):
+            return chunk.encode(self.encoding)
+        return chunk
+
+    def chunks(self) -> Iterator[bytes | str]:
+        source = self.source
+        if hasattr(source, "read"):
+            read = getattr(source, "read1", source.read)  # type: ignore
+            return iter(lambda: read(CHUNK_SIZE), source.read(0))  # type: ignore
+        return iter(source)  # type: ignore
+
+    async def chunks_async(self) -> AsyncIterator[bytes | str]:
+        if isinstance(self.source, AsyncIterable):
+            async for chunk in self.source:
+                yield chunk
+            return
+        if isinstance(self.source, Sequence):
+            for chunk in self.source:
+                yield chunk
+            return
+        # file reads and generators may block, so they are executed outside of event loop
+        iterator = self.chunks()
+        done = object()
+        while (chunk := await to_thread(next, iterator, done)) is not done:
+            yield chunk  # type: ignore
+
+    def init(self, io: SyncIO):
+        super().init(io)
+        if isinstance(self.source, AsyncIterable):
+            raise StreamError("Async iterable can only be used with async executor")
+
+    def process(self):
+        try:
+            for chunk in self.chunks():
+                self.sync_io.write(self._encode(chunk))
+            self.sync_io.flush()
+        except BrokenPipeError:
+            # process does not need more input
+            pass
+        finally:
+            self.close()
+
+    async def process_async(self):
+        import anyio
+
+        try:
+            async for chunk in self.chunks_async():
+                await self.async_write.send(self._encode(chunk))
+        except (anyio.BrokenResourceError, BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            await self.close_async()
+
+    def close(self):
+        if hasattr(self, "sync_io") and not self.sync_io.closed:
+            with suppress(BrokenPipeError):
+                self.sync_io.close()
+
+    async def close_async(self):
+        if hasattr(self, "async_write"):
+            await self.async_write.aclose()
+
+
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+
+def write_buffers(descriptor: int, buffers: list[memoryview]):
+    """Write all buffers into blocking descriptor using writev, partial writes are continued"""
+    buffers = [buffer for buffer in buffers if buffer.nbytes]
+    index = 0
+    while index < len(buffers):
+        written = os.writev(descriptor, buffers[index : index + IOV_MAX])
+        while written:
+            if written >= buffers[index].nbytes:
+                written -= buffers[index].nbytes
+                index += 1
+            else:
+                buffers[index] = buffers[index][written:]
+                written = 0
+
+
+class Send(Feed):
+    """
+    Write data and close
+
+    Buffers (bytes, bytearray, memoryview, mmap) and sequences of them are written without copying (writev)
+    """
+
+    def __init__(self, data: str | Buffer | Iterable[str | Buffer]) -> None:
         if isinstance(data, str):
             data = data.encode()
+        if isinstance(data, Buffer):
+            buffers = [memoryview(data).cast("B")]
+        else:
+            buffers = [
+                memoryview(x.encode() if isinstance(x, str) else x).cast("B")
+                for x in data
+            ]
+        super().__init__(buffers)
         self.data = data
+        self.buffers = buffers
+
+    def process(self):
+        if not hasattr(os, "writev"):
+            return super().process()
+        try:
+            self.sync_io.flush()
+            write_buffers(self.sync_io.fileno(), [*self.buffers])
+        except BrokenPipeError:
+            pass
+        finally:
+            self.close()
+
+
+def _sendfile(source: int, target: int, offset: int, size: int) -> int:
+    return os.sendfile(target, source, offset, size)
+
+
+def _splice(source: int, target: int, offset: int, size: int) -> int:
+    return os.splice(source, target, size, offset_src=offset)
+
+
+def _pread(source: int, target: int, offset: int, size: int) -> int:
+    data = os.pread(source, size, offset)
+    write_buffers(target, [memoryview(data)])
+    return len(data)
+
+
+def copy_file_range(source: int, target: int, offset: int, count: int | None):
+    """Copy part of file into descriptor using os.sendfile or os.splice, read/write is used if both are unsupported"""
+    methods = [_sendfile, *([_splice] if hasattr(os, "splice") else []), _pread]
+    while count is None or count > 0:
+        size = CHUNK_SIZE if count is None else min(count, CHUNK_SIZE)
+        try:
+            copied = methods[0](source, target, offset, size)
+        except BrokenPipeError:
+            raise
+        except OSError:
+            if len(methods) == 1:
+                raise
+            methods.pop(0)
+            continue
+        if copied == 0:
+            return
+        offset += copied
+        if count is not None:
+            count -= copied
+
+
+class SendFile(Stream):
+    """
+    Send file (or its part) into stdin
+
+    Whole file is passed to process directly, otherwise (or if `pipe` is set) it is copied into pipe by kernel (sendfile/splice)
+    """
+
+    def __init__(
+        self,
+        file: str | PurePath | int | IO[bytes],
+        offset: int = 0,
+        count: int | None = None,
+        pipe: bool = False,
+    ) -> None:
+        self.path = file
+        self.offset = offset
+        self.count = count
+        self.pipe = pipe or offset != 0 or count is not None
+        self.file: IO[bytes] | None = None
+        self._source: int | None = None
+        self._write: int | None = None
+        self._read: int | None = None
+
+    def _open(self) -> int:
+        if isinstance(self.path, str | PurePath):
+            self.file = open(self.path, "rb")
+            return self.file.fileno()
+        if isinstance(self.path, int):
+            return self.path
+        return self.path.fileno()
+
+    def setup(self, stream: StreamName) -> int | IO | None:
+        if stream != "stdin":
+            raise StreamError("SendFile can only be used as stdin")
+        descriptor = self._open()
+        if not self.pipe:
+            return descriptor
+        self._source = descriptor
+        return subprocess.PIPE
 
     def init(self, io: SyncIO):
-        super().init(io)
-        self.sync_io.write(self.data)
-        self.sync_io.close()
+        if self.pipe:
+            assert io[0] is not None, "No stream passed"
+            self.sync_io = io[0]
+
+    def _copy(self, target: int):
+        assert self._source is not None
+        try:
+            copy_file_range(self._source, target, self.offset, self.count)
+        except BrokenPipeError:
+            pass
+
+    def process(self):
+        if not self.pipe:
+            return
+        try:
+            self._copy(self.sync_io.fileno())
+        finally:
+            with suppress(BrokenPipeError):
+                self.sync_io.close()
+
+    async def setup_async(self, stream: StreamName):
+        descriptor = self.setup(stream)
+        if not self.pipe:
+            return descriptor
+        self._read, self._write = os.pipe()
+        return self._read
 
     async def init_async(self, io: AsyncIO):
-        await super().init_async(io)
-        await self.async_write.send(self.data)
-        await self.async_write.aclose()
+        if self._read is not None:
+            os.close(self._read)
+            self._read = None
+
+    async def process_async(self):
+        if self._write is None:
+            return
+        try:
+            await to_thread(self._copy, self._write)
+        finally:
+            await self.close_async()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    async def close_async(self):
+        for descriptor in (self._read, self._write):
+            if descriptor is not None:
+                os.close(descriptor)
+        self._read = self._write = None
+        self.close()
 
 
 class FileStream(Stream):
@@ -229,3 +774,259 @@ class FileStream(Stream):
     def close(self):
         if not self.file.closed:
             self.file.close()
+
+
+class _Sink:
+    def __init__(
+        self,
+        descriptor: int | None = None,
+        write: Callable[[bytes], Any] | None = None,
+        close: Callable[[], Any] | None = None,
+    ):
+        self.descriptor = descriptor
+        self.write = write
+        self.close = close
+        self.pipe = descriptor is not None and stat.S_ISFIFO(
+            os.fstat(descriptor).st_mode
+        )
+
+
+def _write_all(descriptor: int, data: bytes | memoryview):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(descriptor, view) :]
+
+
+def _fileno(sink: Any) -> int | None:
+    """Descriptor of file-like object, None for in-memory files (fileno of BytesIO raises io.UnsupportedOperation)"""
+    try:
+        return sink.fileno()
+    except (AttributeError, OSError):
+        return None
+
+
+def _close_descriptor(descriptor: int):
+    return lambda: os.close(descriptor)
+
+
+def _load_tee() -> Callable[[int, int, int], int] | None:
+    """tee(2) is not exposed by os module, so it is called from libc"""
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+
+    try:
+        function = ctypes.CDLL(None, use_errno=True).tee
+    except (OSError, AttributeError):
+        return None
+    function.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_size_t, ctypes.c_uint]
+    function.restype = ctypes.c_ssize_t
+
+    def tee(source: int, target: int, size: int) -> int:
+        result = function(source, target, size, 0)
+        if result < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        return result
+
+    return tee
+
+
+type TeeSink = Stream | str | PurePath | int | IO | Any
+"""Stream, path, descriptor, file-like object (write) or hash object (update)"""
+
+
+_tee = _load_tee()
+
+
+class Tee(Stream):
+    """
+    Send output to several sinks (`Pipe` to next command, `FileStream`, `Capture`, descriptors, files or hashes)
+
+    On linux output is copied between descriptors by kernel (tee(2)/os.splice), data is read into
+    memory only for in-memory sinks, otherwise buffered relay is used
+    """
+
+    reports_activity = True
+    zero_copy = hasattr(os, "splice")
+
+    def __init__(self, *sinks: TeeSink):
+        assert sinks, "Tee requires at least one sink"
+        self.sinks = sinks
+        self._sinks: list[_Sink] = []
+        self._source: int | None = None
+        self._write: int | None = None
+
+    def _open(self):
+        for sink in self.sinks:
+            if isinstance(sink, str | PurePath):
+                sink = FileStream(sink)
+            if isinstance(sink, Pipe):
+                write = sink.writer()
+                self._sinks.append(_Sink(write, close=_close_descriptor(write)))
+            elif isinstance(sink, DevNull):
+                continue
+            elif isinstance(sink, Capture):
+                self._sinks.append(_Sink(write=sink.feed_data, close=sink.feed_eof))
+            elif isinstance(sink, Stream):
+                io = sink.setup("stdout")
+                if not has_fileno_guard(io):
+                    raise StreamError(f"Unable to use {sink} as Tee sink")
+                self._sinks.append(_Sink(io.fileno(), close=sink.close))
+            elif isinstance(sink, int):
+                self._sinks.append(_Sink(sink))
+            elif (descriptor := _fileno(sink)) is not None:
+                if (flush := getattr(sink, "flush", None)) is not None:
+                    flush()
+                self._sinks.append(_Sink(descriptor))
+            elif (update := getattr(sink, "update", None)) is not None:
+                self._sinks.append(_Sink(write=update))
+            elif (write := getattr(sink, "write", None)) is not None:
+                self._sinks.append(_Sink(write=write))
+            else:
+                raise StreamError(f"Unable to use {sink} as Tee sink")
+
+    def setup(self, stream: StreamName) -> int | IO | None:
+        if stream == "stdin":
+            raise StreamError("Tee can't be used as stdin")
+        self._open()
+        return subprocess.PIPE
+
+    def init(self, io: SyncIO):
+        assert io[0] is not None, "No stream passed"
+        self.sync_io = io[0]
+        self._source = self.sync_io.fileno()
+
+    async def setup_async(self, stream: StreamName):
+        if stream == "stdin":
+            raise StreamError("Tee can't be used as stdin")
+        self._open()
+        self._source, self._write = os.pipe()
+        return self._write
+
+    async def init_async(self, io: AsyncIO):
+        if self._write is not None:
+            os.close(self._write)
+            self._write = None
+
+    def process(self):
+        assert self._source is not None
+        try:
+            self._relay(self._source)
+        finally:
+            self._finish()
+
+    async def process_async(self):
+        await to_thread(self.process)
+
+    def _drop(self, sink: _Sink):
+        """Reader of sink is closed, rest of sinks still receive output"""
+        self._sinks.remove(sink)
+        if sink.close is not None:
+            sink.close()
+
+    def _dispatch(
+        self, data: bytes, skip: _Sink | None = None, only: _Sink | None = None
+    ):
+        for sink in [*self._sinks]:
+            if sink is skip or (only is not None and sink is not only):
+                continue
+            try:
+                if sink.descriptor is not None:
+                    _write_all(sink.descriptor, data)
+                else:
+                    assert sink.write is not None
+                    sink.write(data)
+            except BrokenPipeError:
+                self._drop(sink)
+
+    def _read(self, source: int, size: int):
+        chunks = []
+        while size and (chunk := os.read(source, size)):
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _splice(self, source: int, sink: _Sink, size: int):
+        """Move exactly size bytes from source into sink"""
+        assert sink.descriptor is not None
+        while size:
+            try:
+                moved = os.splice(source, sink.descriptor, size)
+            except BrokenPipeError:
+                self._drop(sink)
+                self._read(source, size)
+                return
+            except OSError:
+                # for example file opened with O_APPEND
+                self.zero_copy = False
+                self._dispatch(self._read(source, size), only=sink)
+                return
+            if moved == 0:
+                return
+            size -= moved
+
+    def _relay(self, source: int):
+        while self._sinks:
+            descriptors = [x for x in self._sinks if x.descriptor is not None]
+            single = len(self._sinks) == 1 and len(descriptors) == 1
+            pipes = [x for x in descriptors if x.pipe]
+            if self.zero_copy and single:
+                try:
+                    moved = os.splice(source, descriptors[0].descriptor, CHUNK_SIZE)  # type: ignore
+                except BrokenPipeError:
+                    self._drop(descriptors[0])
+                    continue
+                except OSError:
+                    self.zero_copy = False
+                    continue
+                if moved == 0:
+                    return
+                self.touch()
+            elif self.zero_copy and pipes and _tee is not None:
+                primary = pipes[0]
+                try:
+                    size = _tee(source, primary.descriptor, CHUNK_SIZE)  # type: ignore
+                except BrokenPipeError:
+                    self._drop(primary)
+                    continue
+                except OSError:
+                    self.zero_copy = False
+                    continue
+                if size == 0:
+                    return
+                self.touch()
+                rest = [x for x in self._sinks if x is not primary]
+                if len(rest) == 1 and rest[0].descriptor is not None:
+                    self._splice(source, rest[0], size)
+                else:
+                    self._dispatch(self._read(source, size), skip=primary)
+            else:
+                data = os.read(source, CHUNK_SIZE)
+                if not data:
+                    return
+                self.touch()
+                self._dispatch(data)
+        # all readers are closed, output is discarded, so producer is not blocked
+        while os.read(source, CHUNK_SIZE):
+            pass
+
+    def _finish(self):
+        sinks, self._sinks = self._sinks, []
+        for sink in sinks:
+            if sink.close is not None:
+                sink.close()
+
+    def close(self):
+        self._finish()
+        if hasattr(self, "sync_io"):
+            self.sync_io.close()
+        elif self._source is not None:
+            os.close(self._source)
+        self._source = None
+
+    async def close_async(self):
+        if self._write is not None:
+            os.close(self._write)
+            self._write = None
+        self.close()
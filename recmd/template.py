@@ -1,5 +1,6 @@
+from functools import lru_cache
 import sys
-from typing import Never
+from typing import Any, Callable, Iterator, Literal, Never
 
 from recmd.exceptions import TransformError
 from recmd.shell_patch import iterate_arguments
@@ -13,73 +14,135 @@ else:
 
 FORMATTERS = {"s": str, "r": repr, "a": ascii}
 
+STATIC, JOIN, EXPAND = 0, 1, 2
+type Formatter = Callable[[Any], str] | None
+type Part = str | tuple[int, Formatter, str]
+"""Static text or (interpolation index, conversion, format spec)"""
+type Step = (
+    tuple[Literal[0], str]
+    | tuple[Literal[1], tuple[Part, ...]]
+    | tuple[Literal[2], int, Formatter, str]
+)
+"""Static argument, argument joined from parts or :* expansion of interpolation"""
 
-def split_template(template: Template):
-    group: list[Interpolation | str] = []
-    quotation = None
-    for value in template:
-        if isinstance(value, Interpolation):
-            group.append(value)
-            continue
-        assert isinstance(value, str)
 
+def split_template(
+    strings: tuple[str, ...], specs: tuple[tuple[str | None, str], ...]
+) -> Iterator[list[str | int]]:
+    """Split static strings into argument groups, interpolations are represented by their index"""
+    group: list[str | int] = []
+    quotation = None
+    for index, value in enumerate(strings):
         for i, (chunk, quotation) in enumerate(iterate_arguments(value, quotation)):
             if i > 0:
                 yield group.copy()
                 group.clear()
             if chunk:
                 group.append(chunk)
+        if index < len(specs):
+            group.append(index)
     if quotation is not None:
         raise TransformError(f"{quotation} is not closed")
     if group:
         yield group
 
 
-def _is_expand(interpolation: Interpolation):
-    return bool(interpolation.format_spec) and (
-        interpolation.format_spec == "*"
-        or interpolation.format_spec.startswith("*!")
-        or interpolation.format_spec.startswith("*:")
+def _is_expand(format_spec: str):
+    return bool(format_spec) and (
+        format_spec == "*"
+        or format_spec.startswith("*!")
+        or format_spec.startswith("*:")
     )
 
 
-def _to_string(item: str | Interpolation):
-    if isinstance(item, Interpolation):
-        if _is_expand(item):
-            raise TransformError(":* arguments should not have prefixes/postfixes")
-        value = item.value
-        if item.conversion:
-            formatter = FORMATTERS[item.conversion]
-            value = formatter(value)
-        if item.format_spec:
-            value = format(value, item.format_spec)
-        if not isinstance(value, str):
-            return str(value)
-        return value
-    return item
+def _formatter(conversion: str | None) -> Formatter:
+    if not conversion:
+        return None
+    if conversion not in FORMATTERS:
+        raise TransformError(f"Invalid conversion: !{conversion}")
+    return FORMATTERS[conversion]
 
 
-def template_to_command(template: Template):
-    for group in split_template(template):
-        group = list(group)
+@lru_cache(maxsize=1024)
+def template_plan(
+    strings: tuple[str, ...], specs: tuple[tuple[str | None, str], ...]
+) -> tuple[Step, ...]:
+    """
+    Precompute argument splitting for static strings and (conversion, format_spec) of interpolations
+
+    Result is cached, so only interpolated values are formatted for repeated templates
+    """
+    plan: list[Step] = []
+    for group in split_template(strings, specs):
         if (
             len(group) == 1
-            and isinstance(group[0], Interpolation)
-            and _is_expand(group[0])
+            and isinstance(group[0], int)
+            and _is_expand(specs[group[0]][1])
         ):
-            if group[0].conversion:
+            conversion, format_spec = specs[group[0]]
+            if conversion:
                 raise TransformError(
-                    f"Transform (!{group[0].conversion}) should be after :*, not before"
+                    f"Transform (!{conversion}) should be after :*, not before"
                 )
-            fmt = group[0].format_spec.removeprefix("*")
-            value = list(group[0].value)
+            fmt = format_spec.removeprefix("*")
+            formatter = None
             if fmt.startswith("!"):
-                formatter = FORMATTERS[fmt.removeprefix("!")[0]]
+                formatter = _formatter(fmt[1:2])
                 fmt = fmt[2:]
-                value = [formatter(x) for x in group[0].value]
-            if fmt.startswith(":"):
-                spec = fmt.removeprefix(":")
-                value = [format(x, spec) for x in group[0].value]
-            yield from value
+            plan.append((EXPAND, group[0], formatter, fmt.removeprefix(":")))
             continue
-        yield "".join(_to_string(x) for x in group)
+
+        parts: list[Part] = []
+        for item in group:
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            conversion, format_spec = specs[item]
+            if _is_expand(format_spec):
+                raise TransformError(":* arguments should not have prefixes/postfixes")
+            parts.append((item, _formatter(conversion), format_spec))
+        if all(isinstance(part, str) for part in parts):
+            plan.append((STATIC, "".join(parts)))  # type: ignore
+        else:
+            plan.append((JOIN, tuple(parts)))
+    return tuple(plan)
+
+
+def _to_string(value: Any, formatter: Formatter, format_spec: str) -> str:
+    if formatter is not None:
+        value = formatter(value)
+    if format_spec:
+        return format(value, format_spec)
+    if not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def template_to_command(template: Template):
+    plan = template_plan(
+        template.strings,
+        tuple((x.conversion, x.format_spec) for x in template.interpolations),
+    )
+    values = template.values
+    for step in plan:
+        if step[0] == STATIC:
+            yield step[1]
+        elif step[0] == JOIN:
+            yield "".join(
+                [
+                    part
+                    if isinstance(part, str)
+                    else _to_string(values[part[0]], part[1], part[2])
+                    for part in step[1]
+                ]
+            )
+        else:
+            _, index, formatter, format_spec = step
+            if formatter is None and not format_spec:
+                yield from values[index]
+            elif format_spec:
+                yield from [
+                    _to_string(x, formatter, format_spec) for x in values[index]
+                ]
+            else:
+                yield from map(formatter, values[index])  # type: ignore
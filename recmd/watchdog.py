@@ -0,0 +1,99 @@
+import time
+from typing import TYPE_CHECKING, Literal
+
+from .exceptions import CommandTimeout
+from .stream import Stream, StreamError
+
+if TYPE_CHECKING:
+    from .command import Command
+
+__all__ = ["Watchdog", "check_idle", "observed_streams"]
+
+Reason = Literal["timeout", "idle"]
+
+
+def observed_streams(command: "Command") -> list[Stream]:
+    """Output streams of command that report activity (read by current process)"""
+    return [
+        stream
+        for stream in (command.stdout, command.stderr)
+        if isinstance(stream, Stream) and stream.reports_activity
+    ]
+
+
+def check_idle(command: "Command"):
+    """Idle timeout can't be tracked if output is not read by current process (`Pipe`, files, inherited stdout)"""
+    if command.idle_timeout is not None and not observed_streams(command):
+        raise StreamError(
+            f"Output of {command.cmd} is not read by current process, idle timeout can't be tracked"
+        )
+
+
+class Watchdog:
+    """
+    Tracks deadline and output inactivity of running command, executors terminate process when `check` returns reason
+    (and kill it if it is still running after `grace` seconds)
+
+    Activity is reported by streams that receive output in current process (`Stream.touch`)
+    """
+
+    def __init__(self, command: "Command", start: float) -> None:
+        self.command = command
+        self.start = start
+        self.deadline = command.deadline
+        # own timeout of command, None if deadline of group comes first
+        self.timeout: float | None = None
+        if command.timeout is not None:
+            deadline = start + command.timeout
+            if self.deadline is None or deadline <= self.deadline:
+                self.deadline = deadline
+                self.timeout = command.timeout
+        self.idle = command.idle_timeout
+        self.grace = command.kill_grace
+        self.streams = observed_streams(command)
+        self.reason: Reason | None = None
+
+    @classmethod
+    def create(cls, command: "Command") -> "Watchdog | None":
+        """Returns None if command has no timeouts, so nothing is started"""
+        if (
+            command.timeout is None
+            and command.deadline is None
+            and command.idle_timeout is None
+        ):
+            return None
+        return cls(command, time.monotonic())
+
+    def last_activity(self) -> float:
+        return max(
+            [
+                self.start,
+                *(
+                    activity
+                    for stream in self.streams
+                    if (activity := getattr(stream, "last_activity", None)) is not None
+                ),
+            ]
+        )
+
+    def check(self) -> float | None:
+        """Set `reason` if command should be stopped, otherwise returns delay before next check"""
+        now = time.monotonic()
+        delays = []
+        if self.deadline is not None:
+            if now >= self.deadline:
+                self.reason = "timeout"
+                return None
+            delays.append(self.deadline - now)
+        if self.idle is not None:
+            idle = now - self.last_activity()
+            if idle >= self.idle:
+                self.reason = "idle"
+                return None
+            delays.append(self.idle - idle)
+        return min(delays)
+
+    def error(self) -> CommandTimeout:
+        assert self.reason is not None
+        limit = self.idle if self.reason == "idle" else self.timeout
+        return CommandTimeout(self.command, self.reason, limit)
@@ -0,0 +1,113 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+from recmd.bulk import run_many, run_many_async
+from recmd.executor.anyio import AnyioExecutor
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.shell import sh
+from recmd.stream import Capture
+
+# command waits until test releases it (by its value or all at once), so completion order doesn't depend on timing
+GATE = "import os,sys,time\nwhile not any(map(os.path.exists, sys.argv[2:])): time.sleep(0.005)\nprint(sys.argv[1])"
+
+
+@sh
+def command(value: int, gate: Path):
+    own, shared = gate / str(value), gate / "all"
+    return sh(f"{sys.executable} -c {GATE} {value} {own} {shared}") >> Capture()
+
+
+def commands(count: int, pulled: list[int], gate: Path):
+    for i in range(count):
+        pulled.append(i)
+        yield command(i, gate)
+
+
+def release(gate: Path, value: int | str = "all"):
+    (gate / str(value)).touch()
+
+
+def test_run_many(tmp_path: Path):
+    pulled = []
+    with SubprocessExecutor().use():
+        results = run_many(commands(4, pulled, tmp_path), limit=4)
+        release(tmp_path, 3)
+        first = next(results)
+        assert first.stdout.get().strip() == b"3"
+        assert len(pulled) == 4
+        values = [int(first.stdout.get())]
+        for value in [2, 1, 0]:
+            release(tmp_path, value)
+            values.append(int(next(results).stdout.get()))
+        assert next(results, None) is None
+    assert values == [3, 2, 1, 0]
+
+
+def test_run_many_ordered(tmp_path: Path):
+    pulled = []
+    with SubprocessExecutor().use():
+        results = run_many(commands(10, pulled, tmp_path), limit=3, ordered=True)
+        # later commands complete first
+        release(tmp_path, 2)
+        release(tmp_path, 1)
+        release(tmp_path, 0)
+        assert int(next(results).stdout.get()) == 0
+        assert len(pulled) == 4
+        release(tmp_path)
+        assert [int(x.stdout.get()) for x in results] == [*range(1, 10)]
+
+
+def test_run_many_stop(tmp_path: Path):
+    pulled = []
+    with SubprocessExecutor().use():
+        release(tmp_path, 0)
+        for result in run_many(commands(100, pulled, tmp_path), limit=2):
+            assert result.did_complete()
+            # running commands are waited
+            release(tmp_path)
+            break
+    assert len(pulled) == 3
+
+
+@pytest.mark.anyio
+async def test_run_many_async(tmp_path: Path):
+    pulled = []
+    with AnyioExecutor().use():
+        release(tmp_path, 3)
+        async with run_many_async(commands(4, pulled, tmp_path), limit=4) as results:
+            values = []
+            async for result in results:
+                values.append(int(result.stdout.get()))
+                if values[-1]:
+                    release(tmp_path, values[-1] - 1)
+    assert values == [3, 2, 1, 0]
+
+
+@pytest.mark.anyio
+async def test_run_many_async_ordered(tmp_path: Path):
+    pulled = []
+    with AnyioExecutor().use():
+        release(tmp_path)
+        values = []
+        async with run_many_async(
+            commands(10, pulled, tmp_path), 3, ordered=True
+        ) as results:
+            async for result in results:
+                values.append(int(result.stdout.get()))
+                assert len(pulled) <= values[-1] + 4
+    assert values == [*range(10)]
+
+
+@pytest.mark.anyio
+async def test_run_many_async_stop(tmp_path: Path):
+    pulled = []
+    with AnyioExecutor().use():
+        release(tmp_path, 0)
+        async with run_many_async(commands(100, pulled, tmp_path), limit=2) as results:
+            async for result in results:
+                assert result.did_complete()
+                release(tmp_path)
+                break
+    assert len(pulled) <= 4
@@ -0,0 +1,88 @@
+import ast
+
+import pytest
+
+from recmd import patcher
+from recmd.code_cache import CodeCache
+from recmd.patcher import AnyFunctionDef, apply_patch, line_attributes
+
+
+def fix_addition(function: AnyFunctionDef):
+    for node in ast.walk(function):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            node.left = ast.Constant(value=1, **line_attributes(node.left))
+            node.right = ast.Constant(value=1, **line_attributes(node.right))
+
+
+def fix_assert_false(function: AnyFunctionDef):
+    for node in ast.walk(function):
+        if (
+            isinstance(node, ast.Assert)
+            and isinstance(node.test, ast.Constant)
+            and node.test.value is False
+        ):
+            node.test.value = True
+
+
+def no_parse(obj):
+    raise AssertionError("Cached function should not be parsed")
+
+
+def test_cache_hit(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    def define():
+        @apply_patch(fix_addition)
+        def cached():
+            assert 1 + 2 == 2
+
+        return cached
+
+    with CodeCache(tmp_path).use():
+        define()()
+        assert list(tmp_path.iterdir())
+
+        monkeypatch.setattr(patcher, "get_ast", no_parse)
+        define()()
+
+
+def test_cache_multiple_patches(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    def define():
+        @apply_patch(fix_assert_false)
+        @apply_patch(fix_addition)
+        def cached():
+            assert 1 + 2 == 2
+            assert False
+
+        return cached
+
+    with CodeCache(tmp_path).use():
+        define()()
+        monkeypatch.setattr(patcher, "get_ast", no_parse)
+        define()()
+
+
+def test_cache_partial_hit(tmp_path):
+    def define(second: bool):
+        @apply_patch(fix_addition)
+        def cached():
+            assert 1 + 2 == 2
+            assert False
+
+        if second:
+            apply_patch(fix_assert_false)(cached)
+        return cached
+
+    with CodeCache(tmp_path).use():
+        define(False)
+        # first patch is loaded from cache and replayed before second patch
+        define(True)()
+
+
+def test_cache_disabled_for_lambdas(tmp_path):
+    @apply_patch(lambda function: fix_addition(function))
+    def not_cached():
+        assert 1 + 2 == 2
+
+    with CodeCache(tmp_path).use():
+        apply_patch(lambda function: None)(not_cached)
+    assert not list(tmp_path.iterdir())
+    not_cached()
@@ -0,0 +1,81 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+from recmd.__main__ import main
+from recmd.compiler import compile_source
+
+SOURCE = '''"""docstring"""
+from recmd import sh, shell
+
+
+@sh
+def command(value):
+    return shell(f"echo {value} {[1, 2]:*!s}")
+
+
+def untouched(value):
+    return shell(f"echo {value}")
+'''
+
+
+def test_compile_source():
+    result = compile_source(SOURCE)
+    lines = result.splitlines()
+    assert len(lines) == len(SOURCE.splitlines())
+    assert lines[0] == '"""docstring"""'
+    assert lines[4] == "@sh(compiled=True)"
+    assert 'f"echo {value} {[1, 2]:*!s}"' not in lines[6]
+    assert lines[10] == '    return shell(f"echo {value}")'
+    assert compile_source(result) == result
+
+
+def test_compile_decorator_call():
+    result = compile_source("@sh()\ndef a(): ...\n@sh(lazy=True)\ndef b(): ...\n")
+    assert result.splitlines()[0] == "@sh(compiled=True)"
+    assert result.splitlines()[2] == "@sh(lazy=True, compiled=True)"
+
+
+def test_compile_multiline():
+    result = compile_source('import sh\n@sh\ndef a():\n    sh(f"""a\n{1}""")\nb = 1\n')
+    assert result.splitlines()[5] == "b = 1"
+
+
+def test_compiled_module_is_not_patched(monkeypatch: pytest.MonkeyPatch):
+    def no_patch(*args, **kwargs):
+        raise AssertionError("Compiled function should not be patched")
+
+    monkeypatch.setattr(sys.modules["recmd.shell"], "patch_function", no_patch)
+    namespace = {}
+    exec(compile(compile_source(SOURCE), "<compiled>", "exec"), namespace)
+    assert namespace["command"]("a b") == ["echo", "a b", "1", "2"]
+
+
+def test_compiled_module_alias(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    path = tmp_path / "aliased_module.py"
+    path.write_text(
+        compile_source(
+            SOURCE
+            + '\nfrom recmd import sh as run\n\n@run\ndef aliased(value):\n    return shell(f"echo {value}")\n'
+        )
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import aliased_module  # type: ignore
+
+    assert aliased_module.command("a b") == ["echo", "a b", "1", "2"]
+    assert aliased_module.aliased("a b") == ["echo", "a b"]
+
+
+def test_cli(tmp_path: Path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "module.py").write_text(SOURCE)
+    output = tmp_path / "output"
+
+    assert main(["compile", "--check", str(source)]) == 1
+    assert main(["compile", str(source), "-o", str(output)]) == 0
+    assert (source / "module.py").read_text() == SOURCE
+    assert main(["compile", "--check", str(output)]) == 0
+    assert main(["compile", str(source)]) == 0
+    assert (source / "module.py").read_text() == (output / "module.py").read_text()
@@ -1,13 +1,27 @@
+import hashlib
 from pathlib import Path
+import signal
 import sys
 from tempfile import TemporaryDirectory
 
 import anyio
 import pytest
 
+from recmd.command import CommandGroup
+from recmd.exceptions import CommandTimeout
 from recmd.executor.anyio import AnyioExecutor
 from recmd.shell import sh
-from recmd.stream import Capture, IOStream, Send
+from recmd.stream import (
+    Capture,
+    FileStream,
+    IOStream,
+    Pipe,
+    Send,
+    SendFile,
+    SpillCapture,
+    TailCapture,
+    Tee,
+)
 
 
 @sh
@@ -98,3 +112,238 @@ async def test_process_pipe():
                 b"\r", b""
             )
             assert b"123\n" == result
+
+
+@pytest.mark.anyio
+@sh
+async def test_process_large_output():
+    code = "import sys;sys.stdout.write('o' * 2**20);sys.stderr.write('e' * 2**20)"
+    with AnyioExecutor().use():
+        process = python(code) >> Capture[bytes]() >= Capture[bytes]()
+        assert await process
+        assert process.stdout.get() == b"o" * 2**20
+        assert process.stderr.get() == b"e" * 2**20
+
+
+@pytest.mark.anyio
+@sh
+async def test_process_output_encoding():
+    code = "import sys;sys.stdout.buffer.write('ж'.encode('cp1251') * 2**17)"
+    with AnyioExecutor().use():
+        process = python(code) >> Capture[str](encoding="cp1251")
+        assert await process
+        assert process.stdout.get() == "ж" * 2**17
+
+
+@pytest.mark.anyio
+@sh
+async def test_tail_capture():
+    code = "import sys;sys.stdout.write('a' * 10**6 + 'tail')"
+    with AnyioExecutor().use():
+        process = python(code) >> TailCapture(10) >= TailCapture(10)
+        assert await process
+        assert process.stdout.get() == b"a" * 6 + b"tail"
+        assert process.stdout.dropped == 10**6 - 6
+        assert not process.stderr.truncated
+        assert process.stderr.get() == b""
+
+
+@pytest.mark.anyio
+@sh
+async def test_records():
+    code = "import sys;sys.stdout.write('\\0'.join(map(str, range(10**5))))"
+    with AnyioExecutor().use():
+        records = [x async for x in python(code).records(b"\0")]
+        assert records == [str(i).encode() for i in range(10**5)]
+
+
+@pytest.mark.anyio
+@sh
+async def test_lines_stop_early():
+    command = python("import itertools;[print(i) for i in itertools.count()]")
+    with AnyioExecutor().use():
+        async with command.lines() as lines:
+            async for line in lines:
+                if line == "1000":
+                    break
+    assert command.did_complete()
+    assert command.complete.status != 0
+
+
+@pytest.mark.anyio
+@sh
+async def test_process_pipe_chain():
+    producer = "import sys;sys.stdout.write('x' * 2**23)"
+    relay = "import shutil,sys;shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"
+    consumer = "import sys;print(len(sys.stdin.buffer.read()))"
+    with AnyioExecutor().use():
+        group = await (python(producer) | python(relay) | python(consumer) >> Capture())
+        assert group.commands[-1].stdout.get().strip() == b"8388608"
+        assert all(command.complete.status == 0 for command in group.commands)
+
+
+@pytest.mark.anyio
+@pytest.mark.skipif(sys.platform != "linux", reason="F_SETPIPE_SZ is linux only")
+@sh
+async def test_process_pipe_size():
+    pipe = Pipe(size=1 << 20)
+    code = "import fcntl;print(fcntl.fcntl(0, fcntl.F_GETPIPE_SZ))"
+    with AnyioExecutor().use():
+        group = await CommandGroup(
+            python("print()") >> pipe, pipe >> python(code) >> Capture()
+        )
+        assert group.commands[-1].stdout.get().strip() == str(1 << 20).encode()
+        assert pipe._read is None and pipe._write is None
+
+
+@pytest.mark.anyio
+@sh
+async def test_tee():
+    data = b"0123456789" * 2**17
+    pipe = Pipe()
+    capture = Capture[bytes]()
+    digest = hashlib.sha256()
+    with TemporaryDirectory() as directory, AnyioExecutor().use():
+        path = Path(directory) / "output"
+        copy = Path(directory) / "copy"
+        consumer = "import sys;print(len(sys.stdin.buffer.read()))"
+        group = await CommandGroup(
+            python("import sys;sys.stdout.buffer.write(sys.stdin.buffer.read())")
+            .send(data)
+            .with_stdout(
+                Tee(pipe, path, FileStream(copy, append=False), capture, digest)
+            ),
+            pipe >> python(consumer) >> Capture(),
+        )
+        assert group.commands[-1].stdout.get().strip() == str(len(data)).encode()
+        assert path.read_bytes() == data
+        assert copy.read_bytes() == data
+        assert capture.get() == data
+        assert digest.digest() == hashlib.sha256(data).digest()
+
+
+@pytest.mark.anyio
+@sh
+async def test_spill_capture():
+    code = "import sys;sys.stdout.write('x' * 2**20)"
+    with AnyioExecutor().use():
+        process = python(code) >> SpillCapture(threshold=2**16)
+        assert await process
+        with process.stdout.view() as view:
+            assert len(view) == 2**20 and view[0] == ord("x")
+        assert process.stdout.get() == b"x" * 2**20
+        process.stdout.release()
+        assert process.stdout.mapped is None
+
+
+ECHO = "import shutil,sys;shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"
+
+
+@pytest.mark.anyio
+@sh
+async def test_send_large():
+    data = b"x" * 2**23
+    with AnyioExecutor().use():
+        assert await python(ECHO).send(data).output(False) == data
+
+
+@pytest.mark.anyio
+@sh
+async def test_feed():
+    async def chunks():
+        for i in range(10**4):
+            yield f"{i}\n"
+
+    with AnyioExecutor().use():
+        result = await python(ECHO).feed(chunks()).output()
+        assert result.split() == [str(i) for i in range(10**4)]
+        result = await python(ECHO).feed(x for x in [b"a", b"b"]).output(False)
+        assert result == b"ab"
+        assert await python(ECHO).feed("x" * 2**16).output() == "x" * 2**16
+
+
+@pytest.mark.anyio
+@sh
+async def test_feed_closed_reader():
+    async def chunks():
+        while True:
+            yield b"z" * 2**16
+
+    with AnyioExecutor().use():
+        command = python("import sys;print(sys.stdin.read(3))").feed(chunks())
+        assert await command.output() == "zzz\n"
+
+
+@pytest.mark.anyio
+@sh
+async def test_send_file():
+    data = bytes(range(256)) * 2**12
+    with AnyioExecutor().use(), TemporaryDirectory() as directory:
+        path = Path(directory) / "input"
+        path.write_bytes(data)
+        assert await python(ECHO).with_stdin(SendFile(path)).output(False) == data
+        command = python(ECHO).with_stdin(SendFile(path, offset=10, count=2**19))
+        assert await command.output(False) == data[10 : 10 + 2**19]
+        command = python(ECHO).send([memoryview(data)[:10], bytearray(b"x")])
+        assert await command.output(False) == data[:10] + b"x"
+
+
+@pytest.mark.anyio
+@sh
+async def test_timeout_partial_output():
+    with AnyioExecutor().use():
+        code = "import time;print('started',flush=True);time.sleep(10)"
+        command = (python(code) >> Capture[str]()).with_timeout(0.3)
+        with pytest.raises(CommandTimeout) as error:
+            await command
+        assert error.value.reason == "timeout"
+        assert error.value.stdout == "started\n"
+
+
+@pytest.mark.anyio
+@sh
+async def test_idle_timeout():
+    with AnyioExecutor().use():
+        code = "import time\nfor i in range(3):print(i,flush=True);time.sleep(0.1)\ntime.sleep(10)"
+        command = (python(code) >> Capture[str]()).with_timeout(idle=0.5)
+        with pytest.raises(CommandTimeout) as error:
+            await command
+        assert error.value.reason == "idle"
+        assert error.value.stdout == "0\n1\n2\n"
+
+
+@pytest.mark.anyio
+@sh
+async def test_timeout_kill():
+    with AnyioExecutor().use():
+        code = (
+            "import signal,time;signal.signal(signal.SIGTERM,signal.SIG_IGN);"
+            "print(flush=True);time.sleep(10)"
+        )
+        command = (python(code) >> Capture()).with_timeout(0.3, grace=0.2)
+        with pytest.raises(CommandTimeout), anyio.fail_after(5):
+            await command
+        assert command.complete.status == -signal.SIGKILL
+
+
+@pytest.mark.anyio
+@sh
+async def test_group_deadline():
+    with AnyioExecutor().use():
+        sleep = "import time;time.sleep(10)"
+        group = CommandGroup(python(sleep), python("print()")).with_timeout(0.3)
+        with pytest.raises(CommandTimeout) as error:
+            await group
+        assert error.value.limit is None
+
+
+@pytest.mark.anyio
+@sh
+async def test_wall_clock_time():
+    with AnyioExecutor().use():
+        command = await python("import time;time.sleep(0.1)")
+        assert command.complete.duration >= 0.1
+        assert command.complete.cpu_time is None
+        group = await (python("print()") | python("import sys;sys.stdin.read()"))
+        assert group.duration >= group.commands[0].complete.duration
+        assert group.cpu_time is None
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import signal
+import sys
+
+import pytest
+
+from recmd.command import CommandGroup
+from recmd.exceptions import CommandTimeout
+from recmd.executor.asyncio import AsyncioExecutor, AsyncioProcess
+from recmd.executor.hooks import HookEvent
+from recmd.shell import sh
+from recmd.stream import (
+    Capture,
+    IOStream,
+    Pipe,
+    Send,
+    SpillCapture,
+    StreamError,
+    TailCapture,
+    Tee,
+)
+
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+@pytest.fixture(
+    params=[
+        pytest.param("asyncio", id="asyncio"),
+        pytest.param(
+            ("asyncio", {"use_uvloop": True}),
+            id="uvloop",
+            marks=pytest.mark.skipif(uvloop is None, reason="uvloop is not installed"),
+        ),
+    ]
+)
+def anyio_backend(request):
+    return request.param
+
+
+@sh
+def python(code: str):
+    return sh(f"{sys.executable} -c {code}")
+
+
+@pytest.mark.anyio
+@sh
+async def test_process_start():
+    with AsyncioExecutor().use():
+        command = await python("exit(3)")
+        assert isinstance(command.running._process, AsyncioProcess)
+        assert command.complete.status == 3
+        assert command.complete.duration is not None
+
+
+@pytest.mark.anyio
+@sh
+async def test_process_streams():
+    code = "import sys;sys.stdout.write(input());sys.stderr.write('err')"
+    with AsyncioExecutor().use():
+        command = await (python(code).send("value") >> Capture[str]() >= Capture())
+        assert command.stdout.get() == "value"
+        assert command.stderr.get() == b"err"
+
+
+@pytest.mark.anyio
+@sh
+async def test_large_input_and_output():
+    data = bytes(range(256)) * (1 << 14)
+    code = "import sys;sys.stdout.buffer.write(sys.stdin.buffer.read())"
+    with AsyncioExecutor().use():
+        command = await (python(code).with_stdin(Send([data, data])) >> Capture())
+        assert command.stdout.get() == data * 2
+        command = await (python(code).send(data) >> TailCapture(10, 10))
+        assert command.stdout.head == data[:10]
+        assert command.stdout.tail == data[-10:]
+        spill = SpillCapture(threshold=1 << 16)
+        await (python(code).send(data) >> spill)
+        assert spill.spilled and spill.view() == data
+        spill.release()
+
+
+@pytest.mark.anyio
+@sh
+async def test_feed():
+    code = "import sys;print(sys.stdin.read(),end='')"
+
+    def generate():
+        yield "a"
+        yield b"b"
+
+    async def generate_async():
+        yield "c"
+        await asyncio.sleep(0)
+        yield b"d"
+
+    with AsyncioExecutor().use():
+        command = await (python(code).feed(generate()) >> Capture[str]())
+        assert command.stdout.get() == "ab"
+        command = await (python(code).feed(generate_async()) >> Capture[str]())
+        assert command.stdout.get() == "cd"
+
+
+@pytest.mark.anyio
+@sh
+async def test_feed_closed_reader():
+    with AsyncioExecutor().use():
+        command = await python("import sys;sys.stdin.read(3)").send(b"x" * (1 << 22))
+        assert command.complete.status == 0
+
+
+@pytest.mark.anyio
+@sh
+async def test_pipe_and_tee():
+    digest = hashlib.sha256()
+    with AsyncioExecutor().use():
+        group = await (
+            python("print(123)")
+            | python("print(input())") >> Tee(digest, capture := Capture())
+        )
+        assert capture.get().strip() == b"123"
+        assert digest.hexdigest() == hashlib.sha256(capture.get()).hexdigest()
+        assert all(x.complete.status == 0 for x in group.commands)
+
+        pipe = Pipe()
+        group = await CommandGroup(
+            python("print(1)") >> pipe, pipe >> python("print(input())") >> Capture()
+        )
+        assert group.commands[1].stdout.get().strip() == b"1"
+
+
+@pytest.mark.anyio
+@sh
+async def test_unsupported_stream():
+    with AsyncioExecutor().use():
+        with pytest.raises(StreamError):
+            await (python("print()") >> IOStream())
+
+
+@pytest.mark.anyio
+@sh
+async def test_timeout():
+    with AsyncioExecutor().use():
+        code = (
+            "import signal,time;signal.signal(signal.SIGTERM,signal.SIG_IGN);"
+            "print('started',flush=True);time.sleep(10)"
+        )
+        command = (python(code) >> Capture[str]()).with_timeout(0.3, grace=0.2)
+        with pytest.raises(CommandTimeout) as error:
+            await command
+        assert error.value.stdout == "started\n"
+        assert command.complete.status == -signal.SIGKILL
+
+
+@pytest.mark.anyio
+@sh
+async def test_hooks():
+    executor = AsyncioExecutor()
+    events: list[HookEvent] = []
+    executor.hooks.add(events.append)
+    with executor.use():
+        await (python("print(1)") >> Capture())
+    assert [x.name for x in events] == [
+        "prepare",
+        "spawned",
+        "first_byte",
+        "exit",
+        "closed",
+    ]
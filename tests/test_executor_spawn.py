@@ -0,0 +1,116 @@
+import os
+import signal
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from recmd.exceptions import CommandTimeout
+from recmd.executor.spawn import SpawnedProcess, SpawnExecutor
+from recmd.shell import sh
+from recmd.stream import Capture, DevNull, Pipe, Send
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "posix_spawn"), reason="posix_spawn is not available"
+)
+
+
+@sh
+def python(code: str):
+    return sh(f"{sys.executable} -c {code}")
+
+
+@sh
+def test_spawn_streams():
+    code = "import sys;sys.stdout.write(input());sys.stderr.write('err')"
+    with SpawnExecutor().use():
+        process = python(code).send("value") >> Capture() >= Capture()
+        assert ~process
+        assert isinstance(process.running._process, SpawnedProcess)
+        assert process.stdout.get() == b"value"
+        assert process.stderr.get() == b"err"
+        assert ~(python("print('x')") >> DevNull())
+        assert not ~python("exit(3)")
+        assert (~python("exit(3)")).complete.status == 3
+
+
+@sh
+def test_spawn_send_buffers():
+    # large buffers are written with writev, process reads stdin while it is written
+    data = [b"a" * 100_000, bytearray(b"b" * 100_000), memoryview(b"c" * 10)]
+    with SpawnExecutor().use():
+        command = (
+            Send(data)
+            >> python("import sys;print(len(sys.stdin.buffer.read()),end='')")
+            >> Capture[str]()
+        )
+        assert ~command
+        assert isinstance(command.running._process, SpawnedProcess)
+        assert command.stdout.get() == "200010"
+
+
+@sh
+def test_spawn_pipe_and_env():
+    with SpawnExecutor().use():
+        group = ~(
+            python("import os;print(os.environ['VALUE'])").env(VALUE="123")
+            | python("print(input(),end='')") >> Capture()
+        )
+        assert group.commands[-1].stdout.get() == b"123"
+        assert isinstance(group.commands[0].stdout, Pipe)
+
+
+@sh
+def test_spawn_fallback():
+    with SpawnExecutor().use(), TemporaryDirectory() as directory:
+        command = python("import os;print(os.getcwd(),end='')") >> Capture()
+        assert ~command.with_cwd(directory)
+        assert not isinstance(command.running._process, SpawnedProcess)
+        assert os.path.samefile(command.stdout.get(), directory)
+
+
+@sh
+def test_spawn_missing_executable():
+    with SpawnExecutor().use():
+        with pytest.raises(FileNotFoundError):
+            ~sh("recmd-missing-executable")
+
+
+@sh
+def test_spawn_terminate():
+    with SpawnExecutor().use():
+        with python("import time;time.sleep(10)") as command:
+            command.running.terminate().run()
+        assert command.complete.status == -15
+
+
+@sh
+def test_spawn_resource_usage():
+    with SpawnExecutor().use():
+        command = ~python("exit(2)")
+        assert command.complete.status == 2
+        assert command.complete.max_rss is not None
+        assert command.complete.cpu_time is not None
+
+
+@sh
+def test_spawn_timeout():
+    with SpawnExecutor().use():
+        command = python("import time;time.sleep(30)").with_timeout(0.5)
+        start = time.monotonic()
+        with pytest.raises(CommandTimeout) as error:
+            ~command
+        assert error.value.reason == "timeout"
+        assert time.monotonic() - start < 5
+        assert command.complete.status == -15
+
+
+@sh
+def test_spawn_restores_signals():
+    # python ignores SIGPIPE, child should be stopped by it when it writes into closed pipe
+    with SpawnExecutor().use():
+        script = "(yes; echo $? >&2) | head -n 1"
+        command = ~(sh(["sh", "-c", script]) >> DevNull() >= Capture[str]())
+        assert isinstance(command.running._process, SpawnedProcess)
+        assert command.stderr.get() == f"{128 + signal.SIGPIPE}\n"
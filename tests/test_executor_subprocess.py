@@ -1,10 +1,33 @@
+import hashlib
+import io
+import mmap
 from pathlib import Path
+import os
+import signal
 import sys
+import time
 from tempfile import TemporaryDirectory
 
+import pytest
+
+from recmd.command import CommandGroup
+from recmd.exceptions import CommandTimeout
 from recmd.executor.subprocess import SubprocessExecutor
+from recmd.records import RecordSplitter
 from recmd.shell import sh
-from recmd.stream import Capture, IOStream, Send
+from recmd.stream import (
+    Capture,
+    Feed,
+    FileStream,
+    IOStream,
+    Pipe,
+    Send,
+    SendFile,
+    SpillCapture,
+    StreamError,
+    TailCapture,
+    Tee,
+)
 
 
 @sh
@@ -71,3 +94,310 @@ def test_process_pipe():
         with python("print(123)") | python("print(input())") >> IOStream() as group:
             result = group.commands[-1].stdout.sync_io.read().replace(b"\r", b"")
             assert b"123\n" == result
+
+
+@sh
+def test_process_large_output():
+    code = "import sys;sys.stdout.write('o' * 2**20);sys.stderr.write('e' * 2**20)"
+    with SubprocessExecutor().use():
+        process = python(code) >> Capture[bytes]() >= Capture[bytes]()
+        assert ~process
+        assert process.stdout.get() == b"o" * 2**20
+        assert process.stderr.get() == b"e" * 2**20
+
+
+@sh
+def test_process_output_decoding():
+    code = "import sys;sys.stdout.buffer.write('é'.encode() * 2**17 + b'\\xff')"
+    with SubprocessExecutor().use():
+        process = python(code) >> Capture[str](errors="replace")
+        assert ~process
+        assert process.stdout.get() == "é" * 2**17 + "�"
+
+
+@sh
+def test_tail_capture():
+    code = "import sys;sys.stderr.write(''.join(str(i % 10) for i in range(10**6)))"
+    with SubprocessExecutor().use():
+        process = python(code) >= TailCapture(1000, head_bytes=5)
+        assert ~process
+        assert process.stderr.head == b"01234"
+        assert process.stderr.tail == b"0123456789" * 100
+        assert process.stderr.get() == b"01234" + b"0123456789" * 100
+        assert process.stderr.dropped == 10**6 - 1005
+
+
+@sh
+def test_tail_capture_str():
+    code = "import sys;sys.stdout.buffer.write('é'.encode() * 1000)"
+    with SubprocessExecutor().use():
+        # both ends of discarded part split characters
+        process = python(code) >> TailCapture[str](101, head_bytes=5)
+        assert ~process
+        assert process.stdout.get() == "éé" + "é" * 50
+        assert process.stdout.tail.decode(errors="replace").startswith("�")
+        process = python(
+            "import sys;sys.stdout.buffer.write('é'.encode())"
+        ) >> TailCapture[str](10)
+        assert ~process
+        assert process.stdout.get() == "é"
+        assert process.stdout.data == "é".encode()
+
+
+@sh
+def test_lines():
+    code = "import sys;sys.stdout.write('\\n'.join(map(str, range(10**5))))"
+    with SubprocessExecutor().use():
+        assert [*python(code).lines()] == [str(i) for i in range(10**5)]
+        code = "import sys;sys.stdout.write('a\\0bb\\0\\0c\\0')"
+        assert [*python(code).records(b"\0")] == [b"a", b"bb", b"", b"c"]
+
+
+@sh
+def test_lines_stop_early():
+    command = python("import itertools;[print(i) for i in itertools.count()]")
+    with SubprocessExecutor().use():
+        with command.lines() as lines:
+            for i, line in enumerate(lines):
+                if i == 1000:
+                    break
+                assert line == str(i)
+    assert command.did_complete()
+    assert command.complete.status != 0
+
+
+def test_record_splitter():
+    splitter = RecordSplitter(b"\r\n")
+    assert splitter.feed(b"a\r") == []
+    assert splitter.feed(b"\nb\r\nc") == [b"a", b"b"]
+    assert splitter.feed(b"c" * 10) == []
+    assert splitter.feed_eof() == b"c" * 11
+
+
+@pytest.mark.parametrize("zero_copy", [True, False])
+@sh
+def test_tee(zero_copy: bool, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(Tee, "zero_copy", Tee.zero_copy and zero_copy)
+    data = b"0123456789" * 2**17
+    pipe = Pipe()
+    capture = Capture[bytes]()
+    digest = hashlib.sha256()
+    with TemporaryDirectory() as directory, SubprocessExecutor().use():
+        path = Path(directory) / "output"
+        consumer = "import sys;print(len(sys.stdin.buffer.read()))"
+        group = ~CommandGroup(
+            python("import sys;sys.stdout.buffer.write(sys.stdin.buffer.read())")
+            .send(data)
+            .with_stdout(Tee(pipe, FileStream(path, append=False), capture, digest)),
+            pipe >> python(consumer) >> Capture(),
+        )
+        assert group.commands[-1].stdout.get().strip() == str(len(data)).encode()
+        assert path.read_bytes() == data
+        assert capture.get() == data
+        assert digest.digest() == hashlib.sha256(data).digest()
+
+
+@sh
+def test_tee_closed_reader():
+    pipe = Pipe()
+    with SubprocessExecutor().use():
+        group = ~CommandGroup(
+            python("print('x' * 2**20)") >> Tee(pipe, capture := Capture()),
+            pipe >> python("print(input()[:10])") >> Capture(),
+        )
+        assert group.commands[0].complete.status == 0
+        assert group.commands[-1].stdout.get().strip() == b"x" * 10
+        assert len(capture.get()) == 2**20 + len(os.linesep)
+
+
+@sh
+def test_tee_memory_sinks():
+    buffer = io.BytesIO()
+    digest = hashlib.sha256()
+    with SubprocessExecutor().use():
+        assert ~(python("print('hello')") >> Tee(buffer, digest))
+    assert buffer.getvalue().strip() == b"hello"
+    assert digest.digest() == hashlib.sha256(buffer.getvalue()).digest()
+
+
+@sh
+def test_spill_capture():
+    code = "import sys;sys.stdout.write('x' * 2**20)"
+    with SubprocessExecutor().use():
+        process = python(code) >> SpillCapture(threshold=2**16) >= SpillCapture()
+        assert ~process
+        assert process.stdout.spilled and process.stdout.size == 2**20
+        assert process.stdout.view()[-3:] == b"xxx"
+        assert process.stdout.get() == b"x" * 2**20
+        assert not process.stderr.spilled and process.stderr.get() == b""
+        process.stdout.release()
+        code = "import sys;sys.stdout.buffer.write('é'.encode() * 2**16)"
+        process = python(code) >> SpillCapture[str](1024)
+        assert ~process
+        assert process.stdout.spilled
+        assert process.stdout.get() == "é" * 2**16
+        assert process.stdout.data == "é".encode() * 2**16
+        process.stdout.release()
+
+
+ECHO = "import shutil,sys;shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"
+
+
+@sh
+def test_send_large():
+    data = b"x" * 2**23
+    with SubprocessExecutor().use():
+        assert ~python(ECHO).send(data).output(False) == data
+
+
+@sh
+def test_feed():
+    with SubprocessExecutor().use():
+        chunks = (f"{i}\n" for i in range(10**5))
+        result = ~python(ECHO).feed(chunks).output()
+        assert result.split() == [str(i) for i in range(10**5)]
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / "input"
+            path.write_bytes(b"y" * 2**20)
+            with open(path, "rb") as file:
+                assert ~python(ECHO).feed(file).output(False) == b"y" * 2**20
+        assert ~python(ECHO).feed("x" * 2**16).output() == "x" * 2**16
+        assert list(Feed("abc").chunks()) == ["abc"]
+
+
+@sh
+def test_feed_closed_reader():
+    with SubprocessExecutor().use():
+        chunks = iter(lambda: b"z" * 2**16, None)
+        command = python("import sys;print(sys.stdin.read(3))").feed(chunks)
+        assert ~command.output() == "zzz\n"
+
+
+@sh
+def test_send_buffers():
+    with SubprocessExecutor().use(), TemporaryDirectory() as directory:
+        path = Path(directory) / "input"
+        path.write_bytes(b"mapped")
+        with (
+            open(path, "rb") as file,
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        ):
+            chunks = [
+                b"a" * 2**20,
+                bytearray(b"b"),
+                memoryview(b"xcx")[1:2],
+                "d",
+                mapped,
+            ]
+            result = ~python(ECHO).send(chunks).output(False)
+        assert result == b"a" * 2**20 + b"bcdmapped"
+
+
+@sh
+def test_send_file():
+    data = bytes(range(256)) * 2**12
+    with SubprocessExecutor().use(), TemporaryDirectory() as directory:
+        path = Path(directory) / "input"
+        path.write_bytes(data)
+        assert ~python(ECHO).with_stdin(SendFile(path)).output(False) == data
+        command = python(ECHO).with_stdin(SendFile(path, offset=10, count=2**19))
+        assert ~command.output(False) == data[10 : 10 + 2**19]
+        with open(path, "rb") as file:
+            command = python(ECHO).with_stdin(SendFile(file, pipe=True))
+            assert ~command.output(False) == data
+
+
+@sh
+def test_timeout_partial_output():
+    with SubprocessExecutor().use():
+        code = "import time;print('started',flush=True);time.sleep(10)"
+        command = (python(code) >> Capture[str]()).with_timeout(0.3)
+        with pytest.raises(CommandTimeout) as error:
+            ~command
+        assert error.value.reason == "timeout"
+        assert error.value.stdout == "started\n"
+        assert command.complete.status != 0
+
+
+@sh
+def test_idle_timeout():
+    with SubprocessExecutor().use():
+        code = "import time\nfor i in range(3):print(i,flush=True);time.sleep(0.1)\ntime.sleep(10)"
+        command = (python(code) >> Capture[str]()).with_timeout(idle=0.5)
+        with pytest.raises(CommandTimeout) as error:
+            ~command
+        assert error.value.reason == "idle"
+        assert error.value.stdout == "0\n1\n2\n"
+
+
+@sh
+def test_idle_timeout_pipe():
+    producer = "import time\nfor i in range(10):print(i,flush=True);time.sleep(0.1)"
+    consumer = "import sys\nfor line in sys.stdin:print(line,end='',flush=True)"
+    with SubprocessExecutor().use():
+        # output of producer is not tracked, idle timeout is applied to consumer only
+        group = (python(producer) | python(consumer) >> Capture[str]()).with_timeout(
+            idle=0.5
+        )
+        ~group
+        assert group.commands[-1].stdout.get() == "".join(f"{i}\n" for i in range(10))
+        assert group.commands[0].idle_timeout is None
+        with pytest.raises(StreamError):
+            (python(producer) | python(consumer)).with_timeout(idle=0.5)
+        with pytest.raises(StreamError):
+            ~python(producer).with_timeout(idle=0.5)
+
+
+@sh
+def test_timeout_kill():
+    with SubprocessExecutor().use():
+        code = (
+            "import signal,time;signal.signal(signal.SIGTERM,signal.SIG_IGN);"
+            "print(flush=True);time.sleep(10)"
+        )
+        command = (python(code) >> Capture()).with_timeout(0.3, grace=0.2)
+        start = time.monotonic()
+        with pytest.raises(CommandTimeout):
+            ~command
+        assert time.monotonic() - start < 5
+        assert command.complete.status == -signal.SIGKILL
+
+
+@sh
+def test_group_deadline():
+    with SubprocessExecutor().use():
+        sleep = "import time;time.sleep(10)"
+        group = CommandGroup(python(sleep), python("print()")).with_timeout(0.3)
+        with pytest.raises(CommandTimeout) as error:
+            ~group
+        assert error.value.limit is None
+        assert group.commands[1].complete.status == 0
+
+
+@sh
+def test_group_deadline_rerun():
+    with SubprocessExecutor().use():
+        group = CommandGroup(python("import time;time.sleep(0.2)")).with_timeout(0.5)
+        ~group
+        time.sleep(0.4)
+        # deadline is counted from every start
+        ~group
+        assert group.commands[0].deadline is None
+
+
+@sh
+def test_resource_usage():
+    with SubprocessExecutor().use():
+        code = "data=bytearray(64<<20);sum(range(2000000))"
+        command = ~python(code)
+        complete = command.complete
+        assert complete.max_rss is not None and complete.max_rss > 64 << 20
+        assert complete.cpu_time is not None and complete.cpu_time > 0
+        assert complete.cpu_time == complete.user_time + complete.system_time
+        assert complete.context_switches is not None
+        assert complete.duration is not None and complete.duration > 0
+
+        group = ~(python("print()") | python(code) >> Capture())
+        assert group.max_rss > 64 << 20
+        assert group.cpu_time == sum(x.complete.cpu_time for x in group.commands)
+        assert group.duration >= max(x.complete.duration for x in group.commands)
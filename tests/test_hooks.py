@@ -0,0 +1,70 @@
+import sys
+
+import pytest
+
+from recmd.executor.anyio import AnyioExecutor
+from recmd.executor.hooks import HookEvent
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.shell import sh
+from recmd.stream import Capture, Tee
+
+
+@sh
+def python(code: str):
+    return sh(f"{sys.executable} -c {code}")
+
+
+def check_events(events: list[HookEvent], command):
+    assert [x.name for x in events] == [
+        "prepare",
+        "spawned",
+        "first_byte",
+        "exit",
+        "closed",
+    ]
+    assert all(x.command is command for x in events)
+    assert events[1].pid == command.running.pid
+    assert events[2].stream == "stdout"
+    assert events[3].status == 0
+    times = [x.time for x in events]
+    assert times == sorted(times)
+
+
+@sh
+def test_hooks():
+    executor = SubprocessExecutor()
+    events: list[HookEvent] = []
+    remove = executor.hooks.add(events.append)
+    with executor.use():
+        command = ~(python("print(1)") >> Capture())
+        check_events(events, command)
+
+        remove()
+        events.clear()
+        command = ~(python("print(1)") >> Capture())
+        assert not events
+        assert command.stdout.on_first_byte is None
+
+
+@pytest.mark.anyio
+@sh
+async def test_hooks_async():
+    executor = AnyioExecutor()
+    events: list[HookEvent] = []
+    executor.hooks.add(events.append)
+    with executor.use():
+        command = await (python("print(1)") >> Capture())
+        check_events(events, command)
+
+
+@sh
+def test_first_byte_tee():
+    executor = SubprocessExecutor()
+    events: list[HookEvent] = []
+    executor.hooks.add(events.append)
+    capture = Capture()
+    with executor.use():
+        ~(python("import time;time.sleep(0.3);print(1)") >> Tee(capture))
+    times = {x.name: x.time for x in events}
+    # first byte is reported when output is received, not when relay starts
+    assert times["first_byte"] - times["spawned"] >= 0.2
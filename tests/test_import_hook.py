@@ -0,0 +1,77 @@
+import importlib
+from pathlib import Path
+import sys
+import types
+
+import pytest
+
+from recmd.import_hook import ShellLoader, install, uninstall
+
+MODULE = '''"""docstring"""
+from recmd import sh, shell
+
+
+def command(value):
+    return shell(f"echo {value} {[1, 2]:*!s}")
+
+
+@sh
+def decorated(value):
+    return shell(f"echo {value}")
+'''
+
+
+@pytest.fixture
+def package(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    (tmp_path / "hooked").mkdir()
+    (tmp_path / "hooked" / "__init__.py").write_text("")
+    (tmp_path / "hooked" / "module.py").write_text(MODULE)
+    sys.path.insert(0, str(tmp_path))
+    install("hooked")
+    try:
+        yield tmp_path / "hooked"
+    finally:
+        uninstall()
+        sys.path.remove(str(tmp_path))
+        for name in ["hooked", "hooked.module"]:
+            sys.modules.pop(name, None)
+
+
+def test_import_hook(package: Path):
+    module = importlib.import_module("hooked.module")
+    assert module.__doc__ == "docstring"
+    assert module.command("a b") == ["echo", "a b", "1", "2"]
+    assert module.decorated("a b") == ["echo", "a b"]
+    assert list((package / "__pycache__").glob("module.*.opt-recmd.pyc"))
+
+
+def test_import_hook_cache(package: Path, monkeypatch: pytest.MonkeyPatch):
+    importlib.import_module("hooked.module")
+    sys.modules.pop("hooked.module")
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("Cached module should not be compiled")
+
+    monkeypatch.setattr(ShellLoader, "source_to_code", no_compile)
+    module = importlib.import_module("hooked.module")
+    assert module.command("a") == ["echo", "a", "1", "2"]
+
+
+def test_import_hook_optimization(package: Path, monkeypatch: pytest.MonkeyPatch):
+    importlib.import_module("hooked.module")
+    sys.modules.pop("hooked.module")
+    # bytecode compiled with asserts should not be used with -O
+    flags = {name: getattr(sys.flags, name) for name in sys.flags.__match_args__}
+    monkeypatch.setattr(sys, "flags", types.SimpleNamespace(**flags | {"optimize": 1}))
+    compiled = []
+    source_to_code = ShellLoader.source_to_code
+
+    def record(self, *args, **kwargs):
+        compiled.append(args[1])
+        return source_to_code(self, *args, **kwargs)
+
+    monkeypatch.setattr(ShellLoader, "source_to_code", record)
+    module = importlib.import_module("hooked.module")
+    assert compiled and module.__cached__.endswith(".opt-recmd1.pyc")
+    assert list((package / "__pycache__").glob("module.*.opt-recmd1.pyc"))
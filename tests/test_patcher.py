@@ -1,6 +1,25 @@
 import ast
+from collections import OrderedDict
+import gc
+import importlib
+import inspect
+from pathlib import Path
+from threading import Thread
+import time
 import traceback
-from recmd.patcher import AnyFunctionDef, apply_patch, line_attributes
+import weakref
+
+import pytest
+
+from recmd import patcher
+from recmd.patcher import (
+    AnyFunctionDef,
+    ModuleIndex,
+    apply_ast,
+    apply_patch,
+    line_attributes,
+    queue_patch,
+)
 
 
 def fix_addition(function: AnyFunctionDef):
@@ -53,3 +72,128 @@ def test_lineno():
         assert False
 
     test_lineno()
+
+
+def test_queue_patch(monkeypatch: pytest.MonkeyPatch):
+    compiled = []
+    monkeypatch.setattr(
+        patcher, "apply_ast", lambda *args: compiled.append(apply_ast(*args))
+    )
+
+    @apply_patch(fix_assert_false)
+    @queue_patch(fix_addition)
+    def test_queue_patch():
+        assert 1 + 2 == 2
+        assert False
+
+    test_queue_patch()
+    assert len(compiled) == 1
+
+
+def test_multiple_patchers():
+    @apply_patch(fix_addition, fix_assert_false)
+    def test_multiple_patchers():
+        assert 1 + 2 == 2
+        assert False
+
+    test_multiple_patchers()
+
+
+def test_module_index(monkeypatch: pytest.MonkeyPatch):
+    @apply_patch(fix_addition)
+    def first():
+        assert 1 + 2 == 2
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("Module should be parsed once")
+
+    monkeypatch.setattr(ast, "parse", no_parse)
+
+    @apply_patch(fix_addition)
+    def second():
+        assert 1 + 2 == 2
+
+    first()
+    second()
+
+
+def test_module_index_eviction(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(ModuleIndex, "cache", OrderedDict())
+    monkeypatch.setattr(ModuleIndex, "cache_size", 1)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ["evicted_first", "evicted_second"]:
+        (tmp_path / f"{name}.py").write_text(
+            'from recmd import sh, shell\n\n@sh\ndef command():\n    return shell(f"echo {1}")\n'
+        )
+        module = importlib.import_module(name)
+        assert module.command() == ["echo", "1"]
+    assert list(ModuleIndex.cache) == ["evicted_second"]
+
+
+def test_lazy_patch():
+    @apply_patch(fix_addition, lazy=True)
+    def test_lazy_patch(value: int = 0):
+        assert 1 + 2 == 2
+        return value
+
+    trampoline = test_lazy_patch.__code__
+    assert inspect.signature(test_lazy_patch).parameters.keys() == {"value"}
+    assert test_lazy_patch(1) == 1
+    assert test_lazy_patch.__code__ is not trampoline
+    assert test_lazy_patch() == 0
+
+
+def test_lazy_patch_collected():
+    def define():
+        @apply_patch(fix_addition, lazy=True)
+        def test_lazy_patch_collected():
+            assert 1 + 2 == 2
+
+        return test_lazy_patch_collected
+
+    called, uncalled = define(), define()
+    called()
+    references = [weakref.ref(called), weakref.ref(uncalled)]
+    del called, uncalled
+    gc.collect()
+    assert [reference() for reference in references] == [None, None]
+
+
+def test_lazy_patch_async():
+    @apply_patch(fix_addition, lazy=True)
+    async def test_lazy_patch_async():
+        assert 1 + 2 == 2
+
+    assert inspect.iscoroutinefunction(test_lazy_patch_async)
+    with pytest.raises(StopIteration):
+        test_lazy_patch_async().send(None)
+
+
+def test_lazy_patch_threads():
+    calls = []
+
+    def slow_patch(function: AnyFunctionDef):
+        calls.append(function)
+        time.sleep(0.05)
+        fix_addition(function)
+
+    @apply_patch(slow_patch, lazy=True)
+    def test_lazy_patch_threads():
+        assert 1 + 2 == 2
+
+    threads = [Thread(target=test_lazy_patch_threads) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_lazy_patch_error():
+    @apply_patch(lambda function: 1 / 0, lazy=True)
+    def test_lazy_patch_error():
+        pass
+
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            test_lazy_patch_error()
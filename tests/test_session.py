@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import sys
+
+import anyio
+import pytest
+
+from recmd.exceptions import SessionError
+from recmd.executor.anyio import AnyioExecutor
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.session import LengthPrefixed, Sentinel
+from recmd.shell import sh
+from recmd.stream import Capture, DevNull
+
+UPPER = """
+import sys
+for count, line in enumerate(sys.stdin, 1):
+    line = line.rstrip("\\n")
+    if line == "crash":
+        exit(3)
+    print(line.upper(), flush=True)
+    if count == LIMIT:
+        break
+"""
+
+
+@sh
+def worker(limit: int = 0):
+    return sh(f"{sys.executable} -c {UPPER.replace('LIMIT', str(limit))}")
+
+
+@sh
+def python(code: str):
+    return sh(f"{sys.executable} -c {code}")
+
+
+def test_length_prefixed():
+    framing = LengthPrefixed(size=2)
+    decoder = framing.decoder()
+    data = framing.encode(b"abc") + framing.encode(b"") + framing.encode(b"de")
+    assert decoder.feed(data[:3]) == []
+    assert decoder.feed(data[3:8]) == [b"abc", b""]
+    assert decoder.feed(data[8:]) == [b"de"]
+
+
+@sh
+def test_session():
+    with SubprocessExecutor().use(), worker().session() as session:
+        assert session.request("a") == b"A"
+        assert session.request(b"bc") == b"BC"
+        assert session.starts == 1
+        with pytest.raises(ValueError):
+            session.request("a\nb")
+    assert session.command is None
+
+
+@sh
+def test_session_framing():
+    nul = (
+        "import sys\n"
+        "for record in iter(lambda: sys.stdin.buffer.read1(), b''):\n"
+        " sys.stdout.buffer.write(record.replace(b'\\0', b'!\\0'));sys.stdout.flush()"
+    )
+    length = (
+        "import sys\n"
+        "while size := sys.stdin.buffer.read(4):\n"
+        " data = sys.stdin.buffer.read(int.from_bytes(size)) * 2\n"
+        " sys.stdout.buffer.write(len(data).to_bytes(4) + data);sys.stdout.flush()"
+    )
+    shell = "import sys\nfor line in sys.stdin: print(line.strip(), flush=True)"
+    with SubprocessExecutor().use():
+        with python(nul).session("nul") as session:
+            assert session.request("a") == b"a!"
+            assert session.request("b\n") == b"b\n!"
+        with python(length).session("length") as session:
+            assert session.request(b"a\0\n") == b"a\0\na\0\n"
+        framing = Sentinel(b"END\n", suffix=b"\nEND\n")
+        with python(shell).session(framing) as session:
+            assert session.request("a") == b"a\n"
+
+
+@sh
+def test_session_restart():
+    with SubprocessExecutor().use(), worker().session() as session:
+        assert session.request("a") == b"A"
+        with pytest.raises(SessionError) as error:
+            session.request("crash")
+        assert error.value.status == 3
+        assert session.request("b") == b"B"
+        assert session.starts == 2
+
+    # process exits after every two requests, third request is retried in new process
+    with SubprocessExecutor().use(), worker(2).session(retries=1) as session:
+        assert [session.request(x) for x in "abcde"] == [b"A", b"B", b"C", b"D", b"E"]
+        assert session.starts == 3
+
+
+@sh
+def test_session_large_request():
+    # cat echoes request while it is written, both pipes would be filled
+    data = "x" * 1_000_000
+    with SubprocessExecutor().use(), sh("cat").session() as session:
+        assert session.request(data) == data.encode()
+        assert session.request("a") == b"a"
+    with SubprocessExecutor().use(), sh("cat").session("length") as session:
+        assert session.request(data) == data.encode()
+
+
+@pytest.mark.anyio
+@sh
+async def test_session_large_request_async():
+    data = "x" * 1_000_000
+    with AnyioExecutor().use():
+        async with sh("cat").session("length") as session:
+            assert await session.request_async(data) == data.encode()
+            assert await session.request_async("a") == b"a"
+
+
+@sh
+def test_session_unexpected_responses():
+    # second line of response is received with first one
+    code = "import sys\nfor line in sys.stdin: sys.stdout.write(line + 'extra\\n');sys.stdout.flush()"
+    with SubprocessExecutor().use(), python(code).session() as session:
+        with pytest.raises(SessionError, match="1 unexpected"):
+            session.request("a")
+        assert session.command is None
+        with pytest.raises(SessionError):
+            session.request("b")
+        assert session.starts == 2
+
+
+@sh
+def test_session_stderr():
+    with pytest.raises(AssertionError):
+        (worker() >= Capture()).session()
+    with SubprocessExecutor().use(), (worker() >= DevNull()).session() as session:
+        assert session.request("a") == b"A"
+
+
+@sh
+def test_session_pool():
+    with SubprocessExecutor().use(), worker().session_pool(2) as pool:
+        with ThreadPoolExecutor(4) as threads:
+            values = [f"value{i}" for i in range(40)]
+            assert list(threads.map(pool.request, values)) == [
+                x.upper().encode() for x in values
+            ]
+        assert sum(x.starts for x in pool.sessions) <= 2
+
+
+@pytest.mark.anyio
+@sh
+async def test_session_async():
+    with AnyioExecutor().use():
+        async with worker(2).session(retries=1) as session:
+            assert await session.request_async("a") == b"A"
+            assert [await session.request_async(x) for x in "bcd"] == [
+                b"B",
+                b"C",
+                b"D",
+            ]
+            assert session.starts == 2
+            with pytest.raises(SessionError):
+                await session.request_async("crash")
+            assert await session.request_async("e") == b"E"
+        code = "import sys\nfor line in sys.stdin: sys.stdout.write(line * 2);sys.stdout.flush()"
+        async with python(code).session() as session:
+            with pytest.raises(SessionError, match="unexpected"):
+                await session.request_async("a")
+            assert session.command is None
+
+
+@pytest.mark.anyio
+@sh
+async def test_session_pool_async():
+    results = {}
+
+    async def request(pool, value: str):
+        results[value] = await pool.request_async(value)
+
+    with AnyioExecutor().use():
+        async with worker().session_pool(3) as pool:
+            async with anyio.create_task_group() as tg:
+                for i in range(30):
+                    tg.start_soon(request, pool, f"value{i}")
+        assert results == {f"value{i}": f"VALUE{i}".encode() for i in range(30)}
+        assert sum(x.starts for x in pool.sessions) <= 3
+        assert all(x.command is None for x in pool.sessions)
@@ -1,5 +1,8 @@
+import ast
+
 import pytest
-from recmd import TransformError, apply_patch, patch_shell_arguments
+from recmd import TransformError, apply_patch, patch_shell_arguments, sh
+from recmd.shell_patch import string_to_list
 
 
 def shell(data: str | list[str]) -> list:
@@ -114,3 +117,28 @@ def test_unwrap_suffix_err():
         @apply_patch(patcher=patch_shell_arguments)
         def _():
             shell(f"a b {[]:*}test")
+
+
+def test_lazy_sh():
+    @sh(lazy=True)
+    def test():
+        return shell(f"a b {1}")
+
+    trampoline = test.__code__
+    assert test() == ["a", "b", "1"]
+    assert test.__code__ is not trampoline
+
+
+def test_conversion_comprehension():
+    node = ast.parse('f"git log -n {count} --format {fmt} {args:*!s}"').body[0]
+    assert isinstance(node, ast.Expr) and isinstance(node.value, ast.JoinedStr)
+    assert (
+        ast.unparse(string_to_list(node.value))
+        == "['git', 'log', '-n', f'{count}', '--format', f'{fmt}', *[f'{x!s}' for x in args]]"
+    )
+
+    @apply_patch(patcher=patch_shell_arguments)
+    def test():
+        assert shell(f"a b {1} c d") == ["a", "b", "1", "c", "d"]
+
+    test()
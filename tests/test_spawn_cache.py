@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from recmd.executor.spawn_cache import SpawnCache
+from recmd.executor.subprocess import SubprocessExecutor
+from recmd.shell import sh
+
+
+def test_environment(monkeypatch: pytest.MonkeyPatch):
+    cache = SpawnCache()
+    assert cache.environment({}) is os.environ
+    assert cache.environment({"A": "1"}, inherit=False) == {"A": "1"}
+    merged = cache.environment({"A": "1"})
+    assert merged["A"] == "1" and merged["PATH"] == os.environ["PATH"]
+    assert cache.environment({"A": "1"}) is merged
+    both = cache.environment({"A": "1", "B": "2"})
+    assert cache.environment({"B": "2", "A": "1"}) is both
+    monkeypatch.setenv("RECMD_SPAWN_CACHE", "value")
+    changed = cache.environment({"A": "1"})
+    assert changed is not merged and changed["RECMD_SPAWN_CACHE"] == "value"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="PATH lookup is posix only")
+def test_executable():
+    cache = SpawnCache()
+    with TemporaryDirectory() as first, TemporaryDirectory() as second:
+        env = {"PATH": os.pathsep.join([first, second])}
+        with pytest.raises(FileNotFoundError):
+            cache.executable("recmd-tool", env)
+        path = Path(second) / "recmd-tool"
+        path.write_text("#!/bin/sh\n")
+        path.chmod(0o755)
+        assert cache.executable("recmd-tool", env) == str(path)
+        assert cache.executable("recmd-tool", env) == str(path)
+        path.unlink()
+        path = Path(first) / "recmd-tool"
+        path.write_text("#!/bin/sh\n")
+        path.chmod(0o755)
+        assert cache.executable("recmd-tool", env) == str(path)
+        # executable added to directory that precedes cached one in PATH is found
+        path.unlink()
+        second_path = Path(second) / "recmd-tool"
+        second_path.write_text("#!/bin/sh\n")
+        second_path.chmod(0o755)
+        assert cache.executable("recmd-tool", env) == str(second_path)
+        path.write_text("#!/bin/sh\n")
+        path.chmod(0o755)
+        assert cache.executable("recmd-tool", env) == str(path)
+        assert cache.executable("/bin/sh", env) == "/bin/sh"
+
+
+@sh
+def test_executor_environment(monkeypatch: pytest.MonkeyPatch):
+    code = "import os;print(os.environ['RECMD_VALUE'],end='')"
+    with SubprocessExecutor().use():
+        monkeypatch.setenv("RECMD_VALUE", "first")
+        assert ~sh(f"{sys.executable} -c {code}").output() == "first"
+        monkeypatch.setenv("RECMD_VALUE", "second")
+        assert ~sh(f"{sys.executable} -c {code}").env(X="1").output() == "second"
+        monkeypatch.setenv("RECMD_VALUE", "third")
+        assert ~sh(f"{sys.executable} -c {code}").env(X="1").output() == "third"
@@ -1,5 +1,6 @@
 import pytest
 from recmd import TransformError, shell
+from recmd.template import template_plan
 
 
 def test_basic_split():
@@ -61,3 +62,17 @@ def test_unwrap_prefix_err():
 def test_unwrap_suffix_err():
     with pytest.raises(TransformError):
         shell(t"a b {[]:*}test")
+
+
+def test_unwrap_conversion_and_format():
+    assert shell(t"a {[1, 2]:*!r:>3}") == ["a", "  1", "  2"]
+
+
+def test_plan_cache():
+    def command(value):
+        return shell(t"a --value={value} {[value]:*!s}")
+
+    template_plan.cache_clear()
+    assert command(1) == ["a", "--value=1", "1"]
+    assert command("b c") == ["a", "--value=b c", "b c"]
+    assert template_plan.cache_info().hits == 1